@@ -16,224 +16,430 @@ Usage:
 """
 
 import argparse
-import json
+import ast
+import functools
 import os
+import re
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-import urllib.request
-import urllib.error
+
+import requests
+
+# The Ollama client is shared with the pipeline scripts
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'scripts'))
+from ollama_client import OllamaClient, TimeoutConfig  # noqa: E402
+
+
+# CLI command name -> OllamaDevAssistant method
+COMMANDS = {
+    "analyze": "analyze_code",
+    "document": "generate_documentation",
+    "generate-tests": "generate_tests",
+    "review": "review_changes",
+    "explain": "explain_code",
+}
+
+# One-line task descriptions used when several commands share one prompt
+TASK_INSTRUCTIONS = {
+    "analyze": "Analyze the code for potential bugs, performance improvements, security "
+               "vulnerabilities, code quality and maintainability concerns. Give specific, "
+               "actionable feedback with line references where possible.",
+    "document": "Generate markdown documentation: overview, function/method descriptions, "
+                "parameters and return values, usage examples, edge cases and error handling.",
+    "generate-tests": "Generate a complete, runnable {test_framework} test file covering unit "
+                      "tests, edge cases, error handling and mocks where needed.",
+    "review": "Review the code like a senior developer: architecture, structure, naming, "
+              "error handling, refactoring opportunities and testing considerations.",
+    "explain": "Explain in clear, simple terms what the code does, how it works step by step "
+               "and why certain approaches are used.",
+}
+
+TASK_MARKER_RE = re.compile(r"^=== TASK: (.+?) ===[ \t]*$", re.MULTILINE)
+
+# Rough prompt budget for source code; llama3:8b has an 8K token context
+MAX_CONTEXT_TOKENS = 6000
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (about 4 characters per token)"""
+    return len(text) // 4
+
+
+def _python_boundaries(code):
+    """Line numbers where top-level Python statements start"""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return []
+    starts = []
+    for node in tree.body:
+        # Decorators belong with the function or class they wrap
+        decorators = getattr(node, 'decorator_list', [])
+        starts.append(min([node.lineno] + [d.lineno for d in decorators]) - 1)
+    return starts
+
+
+def _brace_boundaries(code):
+    """Line numbers following lines where brace depth returns to zero (JS/TS)"""
+    starts = []
+    depth = 0
+    quote = None
+    block_comment = False
+    for lineno, line in enumerate(code.splitlines(), 1):
+        i = 0
+        while i < len(line):
+            ch = line[i]
+            if block_comment:
+                if line.startswith('*/', i):
+                    block_comment = False
+                    i += 1
+            elif quote:
+                if ch == '\\':
+                    i += 1
+                elif ch == quote:
+                    quote = None
+            elif line.startswith('//', i):
+                break
+            elif line.startswith('/*', i):
+                block_comment = True
+                i += 1
+            elif ch in '"\'`':
+                quote = ch
+            elif ch == '{':
+                depth += 1
+            elif ch == '}':
+                depth = max(0, depth - 1)
+            i += 1
+        if quote != '`':
+            quote = None  # Only template literals span lines
+        if depth == 0 and not block_comment:
+            starts.append(lineno)
+    return starts
+
+
+def split_code(code, language, max_tokens=MAX_CONTEXT_TOKENS):
+    """Split code into chunks of at most max_tokens, on definition boundaries where possible"""
+    if estimate_tokens(code) <= max_tokens:
+        return [code]
+    
+    lines = code.splitlines(keepends=True)
+    if language == 'py':
+        boundaries = _python_boundaries(code)
+    elif language in ('js', 'jsx', 'ts', 'tsx'):
+        boundaries = _brace_boundaries(code)
+    else:
+        boundaries = []
+    
+    # Break into units at the boundaries, then greedily pack units into chunks
+    cuts = sorted(set(b for b in boundaries if 0 < b < len(lines)))
+    units = [''.join(lines[a:b]) for a, b in zip([0] + cuts, cuts + [len(lines)])]
+    max_chars = max_tokens * 4
+    
+    chunks = []
+    current = ''
+    for unit in units:
+        if current and len(current) + len(unit) > max_chars:
+            chunks.append(current)
+            current = ''
+        while len(unit) > max_chars:
+            # A single definition bigger than the budget is split by lines
+            cut = unit.rfind('\n', 0, max_chars) + 1 or max_chars
+            if current:
+                chunks.append(current)
+                current = ''
+            chunks.append(unit[:cut])
+            unit = unit[cut:]
+        current += unit
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+@functools.lru_cache(maxsize=32)
+def _read_source(path, mtime_ns):
+    """Read a source file once per (path, modification time)"""
+    file_path = Path(path)
+    return file_path.read_text(), file_path.suffix[1:], file_path.name
+
+
+class OllamaCallError(Exception):
+    """An Ollama call failed; the message is what the command prints"""
 
 
 class OllamaDevAssistant:
-    def __init__(self, model="llama3:8b"):
+    # Static prompts, built once so cache keys stay stable across calls
+    SYSTEM_PROMPTS = {
+        "analyze": """You are an expert code reviewer. Analyze the code for:
+- Potential bugs or issues
+- Performance improvements
+- Security vulnerabilities
+- Code quality and best practices
+- Maintainability concerns
+
+Provide specific, actionable feedback.""",
+        "document": """You are a technical documentation expert. Generate clear, 
+comprehensive documentation including:
+- Overview of what the code does
+- Function/method descriptions
+- Parameters and return values
+- Usage examples
+- Edge cases and error handling
+
+Use proper markdown formatting.""",
+        "generate-tests": """You are an expert test engineer. Generate comprehensive test cases using {test_framework}.
+Include:
+- Unit tests for all functions/methods
+- Edge case testing
+- Error handling tests
+- Integration tests where appropriate
+- Mock/stub examples where needed
+
+Write actual, runnable test code.""",
+        "review": """You are a senior developer doing code review. Focus on:
+- Architecture and design patterns
+- Code organization and structure
+- Naming conventions
+- Error handling
+- Potential refactoring opportunities
+- Testing considerations
+
+Be constructive and specific.""",
+        "explain": """You are a patient teacher explaining code to someone learning programming.
+Explain clearly and simply:
+- What the code does (high level)
+- How it works (step by step)
+- Why certain approaches are used
+- What could be confusing
+
+Use analogies where helpful.""",
+    }
+    
+    USER_PROMPTS = {
+        "analyze": ("Analyze this {language} code:",
+                    "Provide a detailed analysis with specific line references where possible."),
+        "document": ("Generate detailed documentation for this {language} code:",
+                     "Create documentation that would help other developers understand and use this code."),
+        "generate-tests": ("Generate comprehensive test cases for this {language} code:",
+                           "Create test file with complete test coverage."),
+        "review": ("Review this {language} code and provide feedback:",
+                   "Provide a code review with specific suggestions for improvement."),
+        "explain": ("Explain this {language} code in clear, simple terms:",
+                    "Help someone understand what this code does and how it works."),
+    }
+    
+    USER_PROMPT_TEMPLATE = "{intro}\n\nFile: {name}\n\n```{language}\n{code}\n```\n\n{closing}"
+    
+    # Test framework by file extension
+    TEST_FRAMEWORKS = {
+        'py': 'pytest',
+        'js': 'Jest',
+        'ts': 'Jest'
+    }
+    
+    def __init__(self, model="llama3:8b", use_cache=True, timeout=None,
+                 max_context=MAX_CONTEXT_TOKENS):
         self.model = model
+        self.max_context = max_context
         # Get Ollama host from environment or use default
         self.ollama_host = os.environ.get('OLLAMA_HOST', 'http://localhost:11434')
         if not self.ollama_host.startswith('http'):
             self.ollama_host = f'http://{self.ollama_host}'
         
-    def _call_ollama(self, prompt, system_prompt=None):
-        """Call Ollama API with the given prompt"""
-        # Build the API request
-        api_url = f"{self.ollama_host}/api/generate"
+        # Pooled, cached client; identical prompts on unchanged files skip the model
+        self.client = OllamaClient(
+            self.ollama_host, model, use_cache=use_cache,
+            timeout=timeout or TimeoutConfig.from_env(read=300),
+            cache_dir='~/.cache/ollama-dev-assistant')
+        self.cache = self.client.cache
+    
+    def close(self):
+        """Release pooled connections"""
+        self.client.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        
+    def _call_ollama(self, prompt, system_prompt=None, cacheable=None):
+        """Call Ollama API with the given prompt
         
-        payload = {
-            "model": self.model,
-            "prompt": prompt,
-            "stream": False
-        }
+        cacheable, if given, decides whether the reply is cached. Raises
+        OllamaCallError if the call fails.
+        """
+        hits = self.cache.hits if self.cache else 0
+        tokens = 0
         
-        if system_prompt:
-            payload["system"] = system_prompt
+        def progress():
+            nonlocal tokens
+            tokens += 1
+            if tokens % 25 == 0:
+                print(f"\r📥 Received {tokens} tokens...", end='', file=sys.stderr, flush=True)
         
         try:
             print(f"🤖 Sending request to Ollama at {self.ollama_host}...", file=sys.stderr)
             print(f"📝 Using model: {self.model}", file=sys.stderr)
             print(f"⏳ Please wait (this may take 1-2 minutes)...\n", file=sys.stderr)
-            
-            # Make the HTTP request
-            req = urllib.request.Request(
-                api_url,
-                data=json.dumps(payload).encode('utf-8'),
-                headers={'Content-Type': 'application/json'}
-            )
-            
-            with urllib.request.urlopen(req, timeout=300) as response:
-                result = json.loads(response.read().decode('utf-8'))
-                return result.get('response', 'No response from Ollama')
-                
-        except urllib.error.URLError as e:
-            return f"Error: Cannot connect to Ollama at {self.ollama_host}. Make sure Ollama is running and OLLAMA_HOST is set correctly. ({str(e)})"
-        except TimeoutError:
-            return "Error: Ollama request timed out (300s limit)"
+            text = self.client.generate(prompt, system_prompt, format=None,
+                                        on_token=progress, raise_errors=True,
+                                        cacheable=cacheable)
+        except requests.exceptions.ConnectionError as e:
+            raise OllamaCallError(f"Error: Cannot connect to Ollama at {self.ollama_host}. Make sure Ollama is running and OLLAMA_HOST is set correctly. ({str(e)})") from e
+        except requests.exceptions.Timeout as e:
+            raise OllamaCallError(f"Error: Ollama request timed out ({self.client.timeout.read:.0f}s limit)") from e
         except Exception as e:
-            return f"Error calling Ollama: {str(e)}"
-    
-    def analyze_code(self, file_path):
-        """Analyze code for potential issues and improvements"""
-        file_path = Path(file_path)
-        
-        if not file_path.exists():
-            return f"Error: File {file_path} not found"
+            raise OllamaCallError(f"Error calling Ollama: {str(e)}") from e
         
-        code = file_path.read_text()
-        language = file_path.suffix[1:]  # Remove the dot
+        if self.cache and self.cache.hits > hits:
+            print("💾 Using cached Ollama response", file=sys.stderr)
+        else:
+            print(f"\r📥 Received {tokens} tokens    ", file=sys.stderr)
         
-        system_prompt = """You are an expert code reviewer. Analyze the code for:
-- Potential bugs or issues
-- Performance improvements
-- Security vulnerabilities
-- Code quality and best practices
-- Maintainability concerns
-
-Provide specific, actionable feedback."""
-
-        prompt = f"""Analyze this {language} code:
-
-File: {file_path.name}
-
-```{language}
-{code}
-```
-
-Provide a detailed analysis with specific line references where possible."""
-
-        return self._call_ollama(prompt, system_prompt)
+        return text or 'No response from Ollama'
     
-    def generate_documentation(self, file_path):
-        """Generate documentation for the code"""
-        file_path = Path(file_path)
+    def _load_file(self, file_path):
+        """Return (code, language, name) for file_path, or None if missing"""
+        path = os.path.abspath(file_path)
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        return _read_source(path, mtime_ns)
+    
+    def run_all(self, file_path, commands):
+        """Run several commands on one file concurrently, reading it once"""
+        self._load_file(file_path)
+        with ThreadPoolExecutor(max_workers=max(1, len(commands))) as executor:
+            futures = {
+                command: executor.submit(getattr(self, COMMANDS[command]), file_path)
+                for command in commands
+            }
+        return {command: future.result() for command, future in futures.items()}
+    
+    def run_multi(self, file_path, commands):
+        """Run several commands on one file with a single Ollama call
         
-        if not file_path.exists():
-            return f"Error: File {file_path} not found"
+        The model answers every task in one response, labelled with
+        === TASK: <name> === markers, so the code is only encoded once.
+        """
+        source = self._load_file(file_path)
+        if source is None:
+            error = f"Error: File {file_path} not found"
+            return {command: error for command in commands}
+        code, language, name = source
+        if estimate_tokens(code) > self.max_context:
+            # Too big for one prompt; each command chunks the file itself
+            return self.run_all(file_path, commands)
         
-        code = file_path.read_text()
-        language = file_path.suffix[1:]
+        test_framework = self.TEST_FRAMEWORKS.get(language, 'standard testing framework')
         
-        system_prompt = """You are a technical documentation expert. Generate clear, 
-comprehensive documentation including:
-- Overview of what the code does
-- Function/method descriptions
-- Parameters and return values
-- Usage examples
-- Edge cases and error handling
+        tasks = "\n".join(
+            f"{i}) {command}: {TASK_INSTRUCTIONS[command].format(test_framework=test_framework)}"
+            for i, command in enumerate(commands, 1)
+        )
+        
+        system_prompt = """You are an expert software engineer helping with code analysis,
+documentation, testing and review. Complete every requested task thoroughly.
+Start each task's output with its marker line exactly as instructed."""
 
-Use proper markdown formatting."""
+        prompt = f"""Perform the following tasks on this {language} code:
 
-        prompt = f"""Generate detailed documentation for this {language} code:
+{tasks}
 
-File: {file_path.name}
+File: {name}
 
 ```{language}
 {code}
 ```
 
-Create documentation that would help other developers understand and use this code."""
+Label each section with a line of the form === TASK: <name> === using the task names above, in the same order."""
 
-        return self._call_ollama(prompt, system_prompt)
-    
-    def generate_tests(self, file_path):
-        """Generate test cases for the code"""
-        file_path = Path(file_path)
+        # A reply without any markers cannot be split, so it is not cached
+        try:
+            response = self._call_ollama(prompt, system_prompt, cacheable=TASK_MARKER_RE.search)
+        except OllamaCallError as e:
+            return {command: str(e) for command in commands}
+        
+        # Split the response on the task markers
+        sections = {}
+        parts = TASK_MARKER_RE.split(response)
+        for label, text in zip(parts[1::2], parts[2::2]):
+            sections[label.strip().lower()] = text.strip()
         
-        if not file_path.exists():
+        # Commands the model skipped or mislabelled are run on their own
+        missing = [command for command in commands if command not in sections]
+        if missing:
+            print(f"⚠️  No section for {', '.join(missing)} in the combined reply, "
+                  f"running separately", file=sys.stderr)
+            sections.update(self.run_all(file_path, missing))
+        return {command: sections[command] for command in commands}
+    
+    def _run_command(self, command, file_path):
+        """Run command on file_path; a failed Ollama call gives its error message"""
+        try:
+            return self._run_prompts(command, file_path)
+        except OllamaCallError as e:
+            return str(e)
+    
+    def _run_prompts(self, command, file_path):
+        """Fill in the prompts for command with file_path's source and call Ollama"""
+        source = self._load_file(file_path)
+        if source is None:
             return f"Error: File {file_path} not found"
+        code, language, name = source
         
-        code = file_path.read_text()
-        language = file_path.suffix[1:]
+        test_framework = self.TEST_FRAMEWORKS.get(language, 'standard testing framework')
         
-        # Determine test framework based on language
-        test_framework = {
-            'py': 'pytest',
-            'js': 'Jest',
-            'ts': 'Jest'
-        }.get(language, 'standard testing framework')
+        intro, closing = self.USER_PROMPTS[command]
+        system_prompt = self.SYSTEM_PROMPTS[command].format(test_framework=test_framework)
+        chunks = split_code(code, language, self.max_context)
+        if len(chunks) == 1:
+            prompt = self.USER_PROMPT_TEMPLATE.format(
+                intro=intro.format(language=language), name=name,
+                language=language, code=code, closing=closing)
+            return self._call_ollama(prompt, system_prompt)
         
-        system_prompt = f"""You are an expert test engineer. Generate comprehensive test cases using {test_framework}.
-Include:
-- Unit tests for all functions/methods
-- Edge case testing
-- Error handling tests
-- Integration tests where appropriate
-- Mock/stub examples where needed
-
-Write actual, runnable test code."""
-
-        prompt = f"""Generate comprehensive test cases for this {language} code:
-
-File: {file_path.name}
-
-```{language}
-{code}
-```
+        # Oversized file: handle each chunk separately, then merge the results
+        print(f"✂️  {name} is about {estimate_tokens(code)} tokens, splitting into {len(chunks)} parts",
+              file=sys.stderr)
+        partials = []
+        for i, chunk in enumerate(chunks, 1):
+            prompt = self.USER_PROMPT_TEMPLATE.format(
+                intro=intro.format(language=language), name=f"{name} (part {i} of {len(chunks)})",
+                language=language, code=chunk, closing=closing)
+            # A failed part raises OllamaCallError and aborts the whole command
+            result = self._call_ollama(prompt, system_prompt)
+            partials.append(f"### Part {i} of {len(chunks)}\n\n{result}")
+        
+        prompt = f"""The file {name} was too large to process at once, so it was handled in {len(chunks)} parts.
+Combine these partial results into one coherent response, removing duplication:
 
-Create test file with complete test coverage."""
+{chr(10).join(partials)}
 
+{closing}"""
         return self._call_ollama(prompt, system_prompt)
     
+    def analyze_code(self, file_path):
+        """Analyze code for potential issues and improvements"""
+        return self._run_command('analyze', file_path)
+    
+    def generate_documentation(self, file_path):
+        """Generate documentation for the code"""
+        return self._run_command('document', file_path)
+    
+    def generate_tests(self, file_path):
+        """Generate test cases for the code"""
+        return self._run_command('generate-tests', file_path)
+    
     def review_changes(self, file_path):
         """Review code changes and suggest improvements"""
-        file_path = Path(file_path)
-        
-        if not file_path.exists():
-            return f"Error: File {file_path} not found"
-        
-        code = file_path.read_text()
-        language = file_path.suffix[1:]
-        
-        system_prompt = """You are a senior developer doing code review. Focus on:
-- Architecture and design patterns
-- Code organization and structure
-- Naming conventions
-- Error handling
-- Potential refactoring opportunities
-- Testing considerations
-
-Be constructive and specific."""
-
-        prompt = f"""Review this {language} code and provide feedback:
-
-File: {file_path.name}
-
-```{language}
-{code}
-```
-
-Provide a code review with specific suggestions for improvement."""
-
-        return self._call_ollama(prompt, system_prompt)
+        return self._run_command('review', file_path)
     
     def explain_code(self, file_path):
         """Explain what the code does in simple terms"""
-        file_path = Path(file_path)
-        
-        if not file_path.exists():
-            return f"Error: File {file_path} not found"
-        
-        code = file_path.read_text()
-        language = file_path.suffix[1:]
-        
-        system_prompt = """You are a patient teacher explaining code to someone learning programming.
-Explain clearly and simply:
-- What the code does (high level)
-- How it works (step by step)
-- Why certain approaches are used
-- What could be confusing
-
-Use analogies where helpful."""
-
-        prompt = f"""Explain this {language} code in clear, simple terms:
-
-File: {file_path.name}
-
-```{language}
-{code}
-```
-
-Help someone understand what this code does and how it works."""
-
-        return self._call_ollama(prompt, system_prompt)
-
+        return self._run_command('explain', file_path)
 
 def main():
     parser = argparse.ArgumentParser(
@@ -241,7 +447,8 @@ def main():
     )
     parser.add_argument(
         "command",
-        choices=["analyze", "document", "generate-tests", "review", "explain"],
+        nargs="?",
+        choices=list(COMMANDS),
         help="Command to execute"
     )
     parser.add_argument(
@@ -257,25 +464,47 @@ def main():
         "--output",
         help="Output file (default: print to stdout)"
     )
+    parser.add_argument(
+        "--commands",
+        help="Comma-separated commands to run together in one Ollama call "
+             "(e.g. analyze,document,review)"
+    )
+    parser.add_argument(
+        "--max-context",
+        type=int,
+        default=MAX_CONTEXT_TOKENS,
+        help=f"Approximate token budget for code per request; larger files are split "
+             f"(default: {MAX_CONTEXT_TOKENS})"
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always query Ollama instead of reusing cached responses"
+    )
     
     args = parser.parse_args()
     
-    assistant = OllamaDevAssistant(model=args.model)
+    commands = None
+    if args.commands:
+        commands = [c.strip() for c in args.commands.split(",") if c.strip()]
+        unknown = [c for c in commands if c not in COMMANDS]
+        if unknown:
+            parser.error(f"unknown command(s) in --commands: {', '.join(unknown)}")
+    elif not args.command:
+        parser.error("a command or --commands is required")
     
-    # Execute the requested command
-    if args.command == "analyze":
-        result = assistant.analyze_code(args.file)
-    elif args.command == "document":
-        result = assistant.generate_documentation(args.file)
-    elif args.command == "generate-tests":
-        result = assistant.generate_tests(args.file)
-    elif args.command == "review":
-        result = assistant.review_changes(args.file)
-    elif args.command == "explain":
-        result = assistant.explain_code(args.file)
-    else:
-        print(f"Unknown command: {args.command}")
-        sys.exit(1)
+    with OllamaDevAssistant(model=args.model, use_cache=not args.no_cache,
+                            max_context=args.max_context) as assistant:
+        # Execute the requested command(s)
+        if commands:
+            results = assistant.run_multi(args.file, commands)
+            result = "\n\n".join(f"## {command}\n\n{text}" for command, text in results.items())
+        else:
+            result = getattr(assistant, COMMANDS[args.command])(args.file)
+        
+        if assistant.cache:
+            print(f"💾 Cache: {assistant.cache.hits} hits, {assistant.cache.misses} misses",
+                  file=sys.stderr)
     
     # Output result
     if args.output:
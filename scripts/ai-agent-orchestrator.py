@@ -4,45 +4,302 @@ AI Agent Orchestrator - Dynamic Multi-Agent Analysis System
 Uses Ollama to orchestrate independent agents and generate analysis
 """
 
+import asyncio
+import functools
 import json
-import requests
+import logging
 import sys
 import os
-from typing import Dict, List, Optional
+import re
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Union
 
-class OllamaClient:
-    def __init__(self, host: str = "http://10.0.2.2:11434", model: str = "llama3:8b"):
-        self.host = host
-        self.model = model  # Model name from Ollama
+from ollama_client import (
+    JsonObjectScanner, OllamaClient, json_dumps_bytes, json_dumps_compact, json_loads
+)
+
+# Raw model replies are logged at DEBUG; set ORCHESTRATOR_LOG_LEVEL=DEBUG to see them
+log = logging.getLogger("orchestrator")
+
+# Fences (with any language tag) around generated code
+_CODE_FENCE_RE = re.compile(r"```[a-zA-Z]*\n?")
+
+# Runs of blank (or whitespace-only) lines; the first one is kept
+_BLANK_RUN_RE = re.compile(r"(\n[^\S\n]*)(?:\n[^\S\n]*)+(?=\n)")
+
+@dataclass(frozen=True)
+class CodeArtifact:
+    """One kind of generated code example and how to prompt for and save it"""
+    marker: str  # Section marker when several artifacts share one call
+    agent_prefix: str  # Generated when an agent with this prefix was involved
+    system_prompt: str
+    prompt: str  # Formatted with feature_request
+    filename: str
+    header: str  # Formatted with feature_request
+    label: str
+    json_key: Optional[str] = None  # Unwrap {json_key: code} replies
+
+CODE_ARTIFACTS = [
+    CodeArtifact(
+        marker="===FRONTEND===",
+        agent_prefix="Agent-A",
+        system_prompt="""You are a React Native expert. Generate clean, production-ready code with proper formatting.
+- Use 2-space indentation
+- Add proper imports at the top
+- Use functional components with hooks
+- Include JSDoc comments for main component
+- Format with proper line breaks and spacing
+Output ONLY the code itself with no JSON wrapping, no explanations.""",
+        prompt="""Generate a well-formatted React Native component for: {feature_request}
+
+Include:
+- All necessary imports (React, useState, useEffect, StyleSheet)
+- JSDoc comment for the component
+- Component with hooks (useState, useEffect)
+- API integration with fetch or axios
+- Real-time WebSocket updates if needed
+- Error handling with try-catch
+- StyleSheet for component styling
+- PropTypes or TypeScript types
+- Export statement
+
+Write complete, properly indented working code:""",
+        filename="frontend-component.jsx",
+        header="/**\n * Auto-generated React Native Component\n * Feature: {feature_request}\n"
+               " * Generated by AI Agent Orchestrator\n */\n\n",
+        label="Frontend component",
+        json_key="component",
+    ),
+    CodeArtifact(
+        marker="===BACKEND===",
+        agent_prefix="Agent-B",
+        system_prompt="""You are a Node.js/Express expert. Generate clean, production-ready code with proper formatting.
+- Use 2-space indentation
+- Add proper imports/requires at the top
+- Include JSDoc comments for functions
+- Format with proper line breaks and spacing
+Output ONLY the code itself with no JSON wrapping, no explanations.""",
+        prompt="""Generate well-formatted Node.js backend code for: {feature_request}
+
+Include:
+- All necessary requires (express, mongoose, socket.io)
+- JSDoc comments for main functions
+- Express.js routes with proper HTTP methods
+- MongoDB schema and CRUD operations
+- WebSocket event handlers
+- Input validation (express-validator or joi)
+- Error handling middleware
+- Async/await with try-catch
+- Module exports
+
+Write complete, properly indented working code:""",
+        filename="backend-api.js",
+        header="/**\n * Auto-generated Express API Endpoint\n * Feature: {feature_request}\n"
+               " * Generated by AI Agent Orchestrator\n */\n\n",
+        label="Backend API",
+    ),
+    CodeArtifact(
+        marker="===INCAR===",
+        agent_prefix="Agent-C",
+        system_prompt="""You are a Python IoT expert. Generate clean, production-ready code with proper formatting.
+- Use 4-space indentation (PEP 8)
+- Add docstrings for functions and classes
+- Include proper imports at the top
+- Format with proper line breaks and spacing
+Output ONLY the code itself with no JSON wrapping, no explanations.""",
+        prompt="""Generate well-formatted Python sensor code for: {feature_request}
+
+Include:
+- All necessary imports (redis, json, logging, time, etc.)
+- Module-level docstring
+- Class or functions with docstrings
+- Sensor data reading/simulation logic
+- Redis pub/sub integration
+- JSON data formatting
+- Error handling with try-except
+- Logging configuration and usage
+- Continuous operation loop with proper exit handling
+- Type hints if appropriate
+
+Write complete, properly indented PEP 8 compliant code:""",
+        filename="sensor-integration.py",
+        header='"""\nAuto-generated Python Sensor Integration\nFeature: {feature_request}\n'
+               'Generated by AI Agent Orchestrator\n"""\n\n',
+        label="Sensor integration",
+    ),
+]
+
+_CODE_MARKER_RE = re.compile(r"^===(FRONTEND|BACKEND|INCAR)===[ \t]*$", re.M)
+
+# Fixed head of every agent's system prompt. Since it is byte-identical
+# across agents and calls, Ollama can reuse its cached KV state for it even
+# when consecutive requests come from different agents.
+RESPONSE_FORMAT_INSTRUCTIONS = """You must respond ONLY with valid JSON. Do not include any explanatory text before or after the JSON.
+
+Required JSON structure:
+{
+  "impact": "string describing the impact",
+  "components": ["component1", "component2"],
+  "changes": ["change1", "change2"],
+  "effort_hours": number,
+  "risks": ["risk1", "risk2"]"""
+
+# Size limits on each analysis, enforced through the response schema
+MAX_IMPACT_CHARS = 400
+MAX_ANALYSIS_ITEMS = 8
+MAX_ITEM_CHARS = 160
+
+# Reply length caps (num_predict); an analysis is bounded by its schema anyway
+ANALYSIS_MAX_TOKENS = 1024
+CODE_MAX_TOKENS = 1500  # Per code artifact
+UI_SPEC_MAX_TOKENS = 1500
+
+# Upstream context handed to an agent: at most this many list items per
+# field, and the oldest agents are dropped once it exceeds MAX_CONTEXT_CHARS
+CONTEXT_LIST_ITEMS = 3
+MAX_CONTEXT_CHARS = 1200
+
+# Fallback values for fields an analysis reply left out
+_ANALYSIS_DEFAULTS = {
+    "impact": lambda: "Not provided",
+    "components": list,
+    "changes": list,
+    "effort_hours": int,
+    "risks": list,
+}
+
+# Risk recorded by the stand-in analysis of an agent whose call failed
+_UNAVAILABLE_RISK = "AI analysis unavailable"
+
+# Words that route a feature request to a frontend agent; substrings, so
+# "app" also matches "application"
+_FRONTEND_KEYWORDS = {
+    "Agent-A1": re.compile(r"mobile|app|user|customer|booking", re.I),
+    "Agent-A2": re.compile(r"staff|admin|fleet|report|dashboard", re.I),
+}
+
+# Terms that must show up in the feature request or the upstream agent's
+# components/changes before a layer is asked at all; an A -> B or B -> C
+# hand-off without any of them is skipped instead of costing an LLM call.
+# CAN only counts in capitals (or as "CAN bus"), not as the English verb
+_LAYER_KEYWORDS = {
+    "Agent-B": re.compile(
+        r"\b(?:api|endpoints?|server|backend|rest|database|db|mongo(?:db)?|"
+        r"postgres(?:ql)?|sql|websockets?)\b", re.I),
+    "Agent-C": re.compile(
+        r"\b(?:sensors?|(?-i:CAN)|can[ -]?bus|vehicle|redis|iot|obd|telemetry|gps|diagnostics?)\b", re.I),
+}
+
+# UI mockups; the tire one is fully static, the generic one takes a title
+_TIRE_MOCKUP = r"""+------------------------------------------------------------------+
+|                    TIRE PRESSURE MONITOR                         |
++------------------------------------------------------------------+
+|                                                                  |
+|        FRONT LEFT              |             FRONT RIGHT         |
+|       .-'''''''-.              |            .-'''''''-.          |
+|      /           \             |           /           \         |
+|     |             |            |          |             |        |
+|     | [=======   ]|            |          | [========= ]|        |
+|     |   2.2 bar   |            |          |   2.2 bar   |        |
+|      \           /             |           \           /          |
+|       '-.......-'              |            '-.......-'           |
+|         [OK]                   |              [OK]               |
+|                                |                                 |
+|--------------------------------+-------------------------------- |
+|                                                                  |
+|        REAR LEFT               |             REAR RIGHT          |
+|       .-'''''''-.              |            .-'''''''-.          |
+|      /           \             |           /           \         |
+|     |             |            |          |             |        |
+|     | [======    ]|            |          | [====      ]|        |
+|     |   2.1 bar   |            |          |   1.9 bar   |        |
+|      \           /             |           \           /          |
+|       '-.......-'              |            '-.......-'           |
+|         [OK]                   |             [LOW!]              |
+|                                                                  |
++------------------------------------------------------------------+
+| Status: 1 tire low pressure    | Last Update: 2 seconds ago      |
++------------------------------------------------------------------+
+| [Refresh] [History] [Alerts] [Settings]                          |
++------------------------------------------------------------------+"""
+
+_GENERIC_MOCKUP = """+------------------------------------------------------------------+
+|  {title}  |
++------------------------------------------------------------------+
+|  [Home]  [Dashboard]  [Settings]  [Profile]                      |
++------------------------------------------------------------------+
+|                                                                  |
+|  Main Content Area:                                              |
+|                                                                  |
+|  +------------------------------------------------------------+  |
+|  | Data Display / Visualization                              |  |
+|  |                                                            |  |
+|  | [=============>            ] 60%                           |  |
+|  |                                                            |  |
+|  +------------------------------------------------------------+  |
+|                                                                  |
+|  +------------------------------------------------------------+  |
+|  | Interactive Controls                                       |  |
+|  |                                                            |  |
+|  |   [Start]    [Stop]    [Refresh]    [Export]              |  |
+|  |                                                            |  |
+|  +------------------------------------------------------------+  |
+|                                                                  |
++------------------------------------------------------------------+
+| Status: Active         | Updated: Just now    | Users: 142       |
++------------------------------------------------------------------+"""
+
+class StreamProgress:
+    """Per-agent token counts for concurrently streaming analyses"""
     
-    def generate(self, prompt: str, system_prompt: Optional[str] = None, format_json: bool = True) -> str:
-        """Generate response from Ollama"""
-        try:
-            url = f"{self.host}/api/generate"
-            payload = {
-                "model": self.model,
-                "prompt": prompt,
-                "stream": False,
-                "options": {
-                    "temperature": 0.7,  # Balance creativity and consistency
-                    "top_p": 0.9
-                }
-            }
-            if format_json:
-                payload["format"] = "json"  # Request JSON format only when needed
-            if system_prompt:
-                payload["system"] = system_prompt
-            
-            response = requests.post(url, json=payload, timeout=120)
-            response.raise_for_status()
-            
-            result = response.json()
-            return result.get("response", "")
-        except Exception as e:
-            print(f"Error calling Ollama: {e}", file=sys.stderr)
-            return ""
+    def __init__(self, names: List[str]):
+        self.started = time.monotonic()
+        self.tokens = dict.fromkeys(names, 0)
+        self.last_token = dict.fromkeys(names, None)
+    
+    def tick(self, name: str):
+        """Record one streamed token for name (called from worker threads)"""
+        self.tokens[name] += 1
+        self.last_token[name] = time.monotonic()
+    
+    def stalled(self, names: List[str], limit: float) -> List[str]:
+        """Names whose stream has started but produced nothing for limit seconds"""
+        now = time.monotonic()
+        return [
+            name for name in names
+            if self.last_token[name] is not None and now - self.last_token[name] > limit
+        ]
+    
+    def render(self, names: List[str]) -> str:
+        """One-line summary of token counts and rates"""
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        return ", ".join(
+            f"{name} {self.tokens[name]} tok ({self.tokens[name] / elapsed:.1f} tok/s)"
+            if self.tokens[name] else f"{name} waiting"
+            for name in names
+        )
+
+@functools.lru_cache(maxsize=None)
+def _analysis_key(agent_name: str) -> str:
+    """Key of an agent's entry in results["analyses"], e.g. agent_b1"""
+    return agent_name.lower().replace("-", "_")
 
 class Agent:
+    # Instructions following the feature request; formatted once per agent
+    TASK_TEMPLATE = """Analyze this feature request from your perspective as {name} for {component}.
+
+Determine:
+1. Impact on your components
+2. What changes are required in your area
+3. Which downstream agents you need (set needs_<agent> flags)
+4. Estimated effort in hours for your component
+5. Potential risks
+
+Respond with ONLY a JSON object, no other text:"""
+    
     def __init__(self, name: str, component: str, role: str, responsibilities: List[str], 
                  apis: List[str], downstream_agents: List[str], ollama: OllamaClient):
         self.name = name
@@ -52,117 +309,176 @@ class Agent:
         self.apis = apis  # APIs this agent exposes
         self.downstream_agents = downstream_agents  # Agents this one can call
         self.ollama = ollama
-        self.analysis_result = None
-    
-    def analyze(self, feature_request: str, context: Dict = None) -> Dict:
-        """Analyze feature request using AI"""
         
+        # JSON schema enforced by Ollama so responses always parse; the length
+        # limits bound how many tokens an analysis can take to decode
+        bullets = {"type": "array", "maxItems": MAX_ANALYSIS_ITEMS,
+                   "items": {"type": "string", "maxLength": MAX_ITEM_CHARS}}
+        properties = {
+            "impact": {"type": "string", "maxLength": MAX_IMPACT_CHARS},
+            "components": bullets,
+            "changes": bullets,
+            "effort_hours": {"type": "number"},
+            "risks": bullets,
+        }
+        # needs_<agent> flag for each downstream agent
+        self.needs_keys = [
+            f"needs_{agent.lower().replace(' ', '_').replace('-', '_')}"
+            for agent in downstream_agents
+        ]
+        for agent_key in self.needs_keys:
+            properties[agent_key] = {"type": "boolean"}
+        self.response_schema = {
+            "type": "object",
+            "properties": properties,
+            "required": list(properties),
+        }
+        
+        # Name, role and downstream agents never change, so build this once
+        self.system_prompt = self._build_system_prompt()
+        self._task_prompt = self.TASK_TEMPLATE.format(name=name, component=component)
+    
+    def analyze(self, feature_request: str, context: Union[Dict, str, None] = None) -> Dict:
+        """Analyze feature request using AI
+        
+        context is the upstream analyses, or those already serialized with
+        _compact_context when several agents share them.
+        """
+        head = self._prompt_head(feature_request, context)
+        response = self.ollama.generate(f"{head}\n\n{self._task_prompt}", self.system_prompt,
+                                        format=self.response_schema, max_tokens=ANALYSIS_MAX_TOKENS,
+                                        semantic_text=head)
+        return self._parse_response(feature_request, response)
+    
+    async def aanalyze(self, feature_request: str, context: Union[Dict, str, None] = None,
+                       on_token: Optional[Callable[[], None]] = None,
+                       cancel: Optional[threading.Event] = None) -> Dict:
+        """Async analyze() so sibling agents can be awaited together"""
+        head = self._prompt_head(feature_request, context)
+        response = await self.ollama.agenerate(f"{head}\n\n{self._task_prompt}", self.system_prompt,
+                                               format=self.response_schema, on_token=on_token,
+                                               max_tokens=ANALYSIS_MAX_TOKENS, cancel=cancel,
+                                               semantic_text=head)
+        # Parse on a worker thread so the event loop keeps servicing siblings
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.ollama.executor, self._parse_response,
+                                          feature_request, response)
+    
+    def _build_system_prompt(self) -> str:
+        """Build the system prompt; it only depends on the agent's fixed role"""
         # Build downstream agents info
         downstream_info = ""
         if self.downstream_agents:
             downstream_info = f"\n\nYou can request help from these downstream agents: {', '.join(self.downstream_agents)}"
             downstream_info += "\nFor each downstream agent, set needs_<agent_name> to true/false (e.g., needs_a1, needs_b2)"
         
-        system_prompt = f"""You are {self.name}, a {self.role} responsible for {self.component}.
-Your responsibilities: {', '.join(self.responsibilities)}
-APIs you provide: {', '.join(self.apis) if self.apis else 'None'}
-{downstream_info}
-
-You must respond ONLY with valid JSON. Do not include any explanatory text before or after the JSON.
+        # Shared instructions first, then the needs_* fields and the
+        # agent's identity, which differ per agent
+        needs_fields = "".join(f',\n  "{agent_key}": true or false' for agent_key in self.needs_keys)
+        
+        return f"""{RESPONSE_FORMAT_INSTRUCTIONS}{needs_fields}
+}}
 
-Required JSON structure:
-{{
-  "impact": "string describing the impact",
-  "components": ["component1", "component2"],
-  "changes": ["change1", "change2"],
-  "effort_hours": number,
-  "risks": ["risk1", "risk2"]"""
+You are {self.name}, a {self.role} responsible for {self.component}.
+Your responsibilities: {', '.join(self.responsibilities)}
+APIs you provide: {', '.join(self.apis) if self.apis else 'None'}{downstream_info}"""
+    
+    @classmethod
+    def _prompt_head(cls, feature_request: str, context: Union[Dict, str, None]) -> str:
+        """Feature request line plus the upstream context, if any"""
+        if isinstance(context, dict):
+            context = cls._compact_context(context) if context else ""
+        if not context:
+            return f"Feature Request: {feature_request}"
+        return f"Feature Request: {feature_request}\n\nContext from other agents:\n{context}"
+    
+    @staticmethod
+    def _compact_context(context: Dict, detailed: Optional[List[str]] = None) -> str:
+        """Serialize upstream analyses with only what downstream agents need
+        
+        The needs_* flags are dropped, lists are cut to their first few items
+        and, if that is still too long, the furthest-upstream agents go first.
+        When detailed names the direct parents, every other agent is reduced
+        to its impact and effort.
+        """
+        compact = {
+            name: {
+                "impact": analysis.get("impact"),
+                **({key: analysis.get(key, [])[:CONTEXT_LIST_ITEMS]
+                    for key in ("components", "changes", "risks")}
+                   if detailed is None or name in detailed else {}),
+                "effort_hours": analysis.get("effort_hours"),
+            }
+            for name, analysis in context.items()
+        }
+        context_str = json_dumps_compact(compact)
+        while len(context_str) > MAX_CONTEXT_CHARS and len(compact) > 1:
+            del compact[next(iter(compact))]
+            context_str = json_dumps_compact(compact)
+        return context_str
+    
+    def _parse_response(self, feature_request: str, response: str) -> Dict:
+        """Turn a raw model response into a validated analysis dict"""
+        # %.500s truncates lazily, only when DEBUG is enabled
+        log.debug("\n--- Raw response from %s ---\n%.500s\n--- End raw response ---\n",
+                  self.name, response)
+        
+        if not response.strip():
+            log.warning("Warning: No JSON object found in %s response", self.name)
+            return self._create_default_analysis(feature_request)
         
-        # Add needs_* fields for downstream agents
-        for agent in self.downstream_agents:
-            agent_key = agent.lower().replace(" ", "_").replace("-", "_")
-            system_prompt += f',\n  "needs_{agent_key}": true or false'
+        # Structured output mode returns bare JSON, so parse it directly and
+        # only fall back to digging the object out of fenced/chatty output
+        try:
+            analysis = json_loads(response)
+        except json.JSONDecodeError as e:
+            analysis = self._extract_json(response)
+            if analysis is None:
+                log.warning("Warning: Could not parse JSON from %s: %s\nAttempted to parse: %.200s",
+                            self.name, e, response)
+                return self._create_default_analysis(feature_request)
         
-        system_prompt += "\n}"
+        if not isinstance(analysis, dict):
+            log.warning("Warning: No JSON object found in %s response", self.name)
+            return self._create_default_analysis(feature_request)
         
-        context_str = ""
-        if context:
-            context_str = f"\n\nContext from other agents:\n{json.dumps(context, indent=2)}"
+        # Validate required keys (older Ollama versions ignore the schema)
+        missing_keys = [key for key in _ANALYSIS_DEFAULTS if key not in analysis]
         
-        prompt = f"""Feature Request: {feature_request}{context_str}
-
-Analyze this feature request from your perspective as {self.name} for {self.component}.
-
-Determine:
-1. Impact on your components
-2. What changes are required in your area
-3. Which downstream agents you need (set needs_<agent> flags)
-4. Estimated effort in hours for your component
-5. Potential risks
-
-Respond with ONLY a JSON object, no other text:"""
+        if missing_keys:
+            log.warning("Warning: Missing keys in %s response: %s", self.name, missing_keys)
+            # Fill in missing keys with defaults
+            for key in missing_keys:
+                analysis[key] = _ANALYSIS_DEFAULTS[key]()
         
-        response = self.ollama.generate(prompt, system_prompt)
+        # A null or scalar list field would break slicing and joining downstream
+        for key, default in _ANALYSIS_DEFAULTS.items():
+            if default is list and not isinstance(analysis[key], list):
+                analysis[key] = []
         
-        # Debug: print raw response
-        print(f"\n--- Raw response from {self.name} ---", file=sys.stderr)
-        print(response[:500], file=sys.stderr)  # First 500 chars
-        print("--- End raw response ---\n", file=sys.stderr)
+        # Ensure needs_* fields exist for downstream agents
+        for agent_key in self.needs_keys:
+            analysis.setdefault(agent_key, False)
         
-        # Try to parse JSON from response
+        return analysis
+    
+    @staticmethod
+    def _extract_json(response: str):
+        """Parse the first balanced {...} of a reply wrapped in fences or prose
+        
+        Older Ollama versions ignore the schema; scanning forward for the
+        object's own closing brace ignores any braces in trailing chatter.
+        """
+        start = response.find("{")
+        if start < 0:
+            return None
+        end = JsonObjectScanner().feed(response[start:])
+        if end is None:
+            return None
         try:
-            # Clean up response - remove markdown code blocks if present
-            cleaned = response.strip()
-            if cleaned.startswith('```'):
-                # Remove markdown code fences
-                lines = cleaned.split('\n')
-                # Remove first line (```json or ```)
-                if lines[0].startswith('```'):
-                    lines = lines[1:]
-                # Remove last line if it's ```
-                if lines and lines[-1].strip() == '```':
-                    lines = lines[:-1]
-                cleaned = '\n'.join(lines)
-            
-            # Find JSON in response (might have extra text)
-            start = cleaned.find('{')
-            end = cleaned.rfind('}') + 1
-            
-            if start >= 0 and end > start:
-                json_str = cleaned[start:end]
-                analysis = json.loads(json_str)
-                
-                # Validate required keys (dynamic based on downstream agents)
-                required_keys = ['impact', 'components', 'changes', 'effort_hours', 'risks']
-                missing_keys = [key for key in required_keys if key not in analysis]
-                
-                if missing_keys:
-                    print(f"Warning: Missing keys in {self.name} response: {missing_keys}", file=sys.stderr)
-                    # Fill in missing keys with defaults
-                    for key in missing_keys:
-                        if key == 'effort_hours':
-                            analysis[key] = 0
-                        elif key in ['components', 'changes', 'risks']:
-                            analysis[key] = []
-                        else:
-                            analysis[key] = "Not provided"
-                
-                # Ensure needs_* fields exist for downstream agents
-                for agent in self.downstream_agents:
-                    agent_key = f"needs_{agent.lower().replace(' ', '_').replace('-', '_')}"
-                    if agent_key not in analysis:
-                        analysis[agent_key] = False
-                
-                self.analysis_result = analysis
-                return analysis
-            else:
-                print(f"Warning: No JSON object found in {self.name} response", file=sys.stderr)
-                return self._create_default_analysis(feature_request)
-                
-        except json.JSONDecodeError as e:
-            print(f"Warning: Could not parse JSON from {self.name}: {e}", file=sys.stderr)
-            print(f"Attempted to parse: {json_str[:200] if 'json_str' in locals() else 'N/A'}", file=sys.stderr)
-            return self._create_default_analysis(feature_request)
+            return json_loads(response[start:start + end])
+        except json.JSONDecodeError:
+            return None
     
     def _create_default_analysis(self, feature_request: str) -> Dict:
         """Create default analysis structure if AI fails"""
@@ -171,17 +487,31 @@ Respond with ONLY a JSON object, no other text:"""
             "components": ["Unknown"],
             "changes": ["Analysis needed"],
             "effort_hours": 0,
-            "risks": ["AI analysis unavailable"]
+            "risks": [_UNAVAILABLE_RISK]
         }
         # Add needs_* fields for downstream agents
-        for agent in self.downstream_agents:
-            agent_key = f"needs_{agent.lower().replace(' ', '_').replace('-', '_')}"
-            analysis[agent_key] = False
+        analysis.update(dict.fromkeys(self.needs_keys, False))
         return analysis
 
 class AgentOrchestrator:
-    def __init__(self, ollama_host: str = "http://10.0.2.2:11434", model: str = "llama3:8b"):
-        self.ollama = OllamaClient(ollama_host, model)
+    PROGRESS_INTERVAL = 5  # Seconds between progress lines during parallel analyses
+    
+    def __init__(self, ollama_host: str = "http://10.0.2.2:11434", model: str = "llama3:8b",
+                 use_cache: bool = True, batch_siblings: Optional[bool] = None):
+        self.ollama = OllamaClient(ollama_host, model, use_cache=use_cache, options={
+            # Greedy, seeded decoding: schema-bound analyses come out the same
+            # for the same prompt, which keeps Jenkins runs reproducible and
+            # makes cached answers (and the semantic cache) safe to reuse
+            "temperature": 0,
+            "top_p": 1.0,
+            "seed": 42
+        })
+        
+        # Analyze sibling agents in one combined call instead of one call each;
+        # helps when the Ollama server handles a single request at a time
+        if batch_siblings is None:
+            batch_siblings = os.environ.get("ORCHESTRATOR_BATCH_SIBLINGS") == "1"
+        self.batch_siblings = batch_siblings
         
         # Define component-level agents with their downstream dependencies
         # Frontend Agents
@@ -312,10 +642,37 @@ class AgentOrchestrator:
             "Agent-C5": self.agent_c5,
         }
     
+    def close(self):
+        """Release the Ollama client's pooled connections and worker threads
+        
+        Call once every step is done: generate_code_examples() and
+        generate_ui_mockup() still use the client after orchestrate().
+        """
+        self.ollama.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+    
     def orchestrate(self, feature_request: str) -> Dict:
         """Orchestrate agents to analyze feature request hierarchically"""
         print(f"[AI] Starting AI-driven hierarchical analysis for: {feature_request}")
         
+        # With the semantic cache enabled, a near-duplicate of an earlier
+        # feature request reuses that whole run instead of any agent calls
+        semantic_cache = self.ollama.semantic_cache
+        embedding = self.ollama.embed(feature_request) if semantic_cache else None
+        scope = f"orchestrate:{self.ollama.model}"
+        if embedding:
+            cached = semantic_cache.get(scope, embedding)
+            if cached is not None:
+                print("[CACHE] Reusing the analysis of a near-identical feature request")
+                results = json_loads(cached)
+                results["feature_request"] = feature_request
+                return results
+        
         results = {
             "feature_request": feature_request,
             "agents_involved": [],
@@ -324,11 +681,8 @@ class AgentOrchestrator:
         }
         
         # Determine which frontend agents to start with based on feature keywords
-        start_agents = []
-        if any(word in feature_request.lower() for word in ['mobile', 'app', 'user', 'customer', 'booking']):
-            start_agents.append("Agent-A1")
-        if any(word in feature_request.lower() for word in ['staff', 'admin', 'fleet', 'report', 'dashboard']):
-            start_agents.append("Agent-A2")
+        start_agents = [name for name, keywords in _FRONTEND_KEYWORDS.items()
+                        if keywords.search(feature_request)]
         
         # If no specific match, start with both frontend agents
         if not start_agents:
@@ -336,10 +690,8 @@ class AgentOrchestrator:
         
         print(f"[INFO] Starting with: {', '.join(start_agents)}")
         
-        # Analyze recursively starting from frontend agents
-        context = {}
-        for agent_name in start_agents:
-            self._analyze_recursive(agent_name, feature_request, context, results, level=0)
+        # Analyze a level at a time starting from frontend agents
+        self._analyze_levels(start_agents, feature_request, results)
         
         # Calculate total effort
         total_effort = sum(
@@ -348,228 +700,277 @@ class AgentOrchestrator:
         )
         results["total_effort_hours"] = total_effort
         
+        # A run where any agent fell back to the default analysis would be
+        # replayed for every similar request, so only complete runs are kept
+        degraded = any(analysis.get("risks") == [_UNAVAILABLE_RISK]
+                       for analysis in results["analyses"].values())
+        if embedding and not degraded:
+            semantic_cache.add(scope, embedding, json_dumps_compact(results))
         return results
     
-    def _analyze_recursive(self, agent_name: str, feature_request: str, 
-                          context: Dict, results: Dict, level: int):
-        """Recursively analyze feature with agent and its downstream dependencies"""
-        indent = "  " * level
-        agent = self.agents.get(agent_name)
-        
-        if not agent:
-            print(f"{indent}[WARN] Agent {agent_name} not found")
-            return
-        
-        if agent_name in results["agents_involved"]:
-            print(f"{indent}[SKIP] {agent_name} already analyzed")
-            return
-        
-        print(f"{indent}[ANALYZE] {agent_name} ({agent.component}): Analyzing...")
-        
-        # Analyze with current context
-        analysis = agent.analyze(feature_request, context)
-        results["agents_involved"].append(agent_name)
-        results["analyses"][agent_name.lower().replace("-", "_")] = analysis
-        results["call_tree"].append({"agent": agent_name, "level": level})
+    def _analyze_levels(self, start_agents: List[str], feature_request: str, results: Dict):
+        """Analyze agents level by level, then record them as a depth-first call tree"""
+        context = {}
+        analyses = {}
+        needed = {}
+        parents = []
+        level_agents = start_agents
+        level = 0
+        
+        while level_agents:
+            indent = "  " * level
+            pending = []
+            for agent_name in level_agents:
+                if agent_name not in self.agents:
+                    print(f"{indent}[WARN] Agent {agent_name} not found")
+                elif agent_name in analyses or agent_name in pending:
+                    print(f"{indent}[SKIP] {agent_name} already analyzed")
+                else:
+                    pending.append(agent_name)
+            
+            # Agents on the same level only depend on the levels above them,
+            # so the whole level is analyzed together
+            analyses.update(self._analyze_level(pending, feature_request, context, parents, level))
+            
+            level_agents = []
+            for agent_name in pending:
+                context[agent_name] = analyses[agent_name]
+                needed[agent_name] = self._needed_downstream(
+                    agent_name, feature_request, analyses[agent_name], indent)
+                level_agents.extend(needed[agent_name])
+            parents = pending
+            level += 1
+        
+        # Record the agents in the order a depth-first walk would reach them
+        visited = set()
+        stack = [(agent_name, 0) for agent_name in reversed(start_agents)]
+        while stack:
+            agent_name, level = stack.pop()
+            if agent_name in visited or agent_name not in analyses:
+                continue
+            visited.add(agent_name)
+            results["agents_involved"].append(agent_name)
+            results["analyses"][_analysis_key(agent_name)] = analyses[agent_name]
+            results["call_tree"].append({"agent": agent_name, "level": level})
+            stack.extend((downstream_agent, level + 1)
+                         for downstream_agent in reversed(needed[agent_name]))
+    
+    def _needed_downstream(self, agent_name: str, feature_request: str, analysis: Dict,
+                           indent: str) -> List[str]:
+        """Downstream agents an analysis asks for"""
+        agent = self.agents[agent_name]
+        needed = []
+        for downstream_agent, agent_key in zip(agent.downstream_agents, agent.needs_keys):
+            if not analysis.get(agent_key, False):
+                continue
+            if not self._layer_relevant(agent_name, downstream_agent, feature_request, analysis):
+                print(f"{indent}  -> {agent_name} flags {downstream_agent}, "
+                      f"but nothing points at that layer; skipping")
+                continue
+            print(f"{indent}  -> {agent_name} needs {downstream_agent}")
+            needed.append(downstream_agent)
+        return needed
+    
+    @staticmethod
+    def _layer_relevant(agent_name: str, downstream_agent: str, feature_request: str,
+                        analysis: Dict) -> bool:
+        """Whether a hand-off into another layer is backed by the analysis text"""
+        layer = downstream_agent[:7]
+        keywords = _LAYER_KEYWORDS.get(layer)
+        if keywords is None or agent_name.startswith(layer):
+            return True
+        text = " ".join([feature_request, *map(str, analysis.get("components") or []),
+                         *map(str, analysis.get("changes") or [])])
+        return keywords.search(text) is not None
+    
+    def _analyze_level(self, agent_names: List[str], feature_request: str,
+                       context: Dict, parents: List[str], level: int) -> Dict[str, Dict]:
+        """Analyze independent agents concurrently; return name -> analysis
         
-        # Update context for downstream agents
-        context[agent_name] = analysis
+        parents is the level above, whose analyses are passed on in full;
+        agents further upstream are only summarized.
+        """
+        indent = "  " * level
+        for name in agent_names:
+            print(f"{indent}[ANALYZE] {name} ({self.agents[name].component}): Analyzing...")
+        
+        # Each agent sees the same snapshot of the context gathered so far,
+        # serialized once for all of them
+        snapshot = Agent._compact_context(context, parents) if context else ""
+        if len(agent_names) == 1:
+            return {agent_names[0]: self.agents[agent_names[0]].analyze(feature_request, snapshot)}
+        
+        analyses = {}
+        pending = agent_names
+        if self.batch_siblings:
+            analyses.update(self._analyze_batched(pending, feature_request, snapshot))
+            pending = [name for name in pending if name not in analyses]
+        if pending:
+            analyses.update(zip(pending, asyncio.run(
+                self._gather_siblings(pending, feature_request, snapshot))))
+        return analyses
+    
+    def _analyze_batched(self, agent_names: List[str], feature_request: str,
+                         context: Union[Dict, str]) -> Dict[str, Dict]:
+        """Analyze several agents in one call; return name -> analysis
+        
+        Agents missing from the combined answer are left out so the caller
+        can analyze them on their own.
+        """
+        agents = [self.agents[name] for name in agent_names]
+        schema = {
+            "type": "object",
+            "properties": {agent.name: agent.response_schema for agent in agents},
+            "required": agent_names,
+        }
+        system_prompt = (
+            "Answer for each of the following agents. Respond with ONE JSON object that has "
+            "a key per agent name, each holding that agent's JSON structure.\n\n"
+            + "\n\n".join(f"=== {agent.name} ===\n{agent.system_prompt}" for agent in agents)
+        )
+        head = Agent._prompt_head(feature_request, context)
+        prompt = f"{head}\n\n" + "\n\n".join(
+            f"=== {agent.name} ===\n{agent._task_prompt}" for agent in agents)
         
-        # Check which downstream agents are needed
-        for downstream_agent in agent.downstream_agents:
-            agent_key = f"needs_{downstream_agent.lower().replace('-', '_')}"
-            if analysis.get(agent_key, False):
-                print(f"{indent}  -> {agent_name} needs {downstream_agent}")
-                self._analyze_recursive(downstream_agent, feature_request, context, results, level + 1)
+        response = self.ollama.generate(prompt, system_prompt, format=schema,
+                                        max_tokens=ANALYSIS_MAX_TOKENS * len(agents),
+                                        semantic_text=head)
+        try:
+            combined = json_loads(response) if response.strip() else {}
+        except json.JSONDecodeError:
+            combined = Agent._extract_json(response) or {}
+        if not isinstance(combined, dict):
+            return {}
+        
+        return {
+            agent.name: agent._parse_response(feature_request, json_dumps_compact(combined[agent.name]))
+            for agent in agents
+            if isinstance(combined.get(agent.name), dict)
+        }
+    
+    async def _gather_siblings(self, agent_names: List[str], feature_request: str,
+                               context: Union[Dict, str]) -> List[Dict]:
+        """Await the analyses of several agents together
+        
+        Token progress is reported to stderr while they stream, and an agent
+        whose stream stalls is abandoned in favour of the default analysis.
+        """
+        progress = StreamProgress(agent_names)
+        # Cancelling a task leaves its worker thread reading; the event stops it
+        cancels = {name: threading.Event() for name in agent_names}
+        tasks = {
+            asyncio.ensure_future(self.agents[name].aanalyze(
+                feature_request, context, on_token=functools.partial(progress.tick, name),
+                cancel=cancels[name])): name
+            for name in agent_names
+        }
+        analyses = {}
+        stall = self.ollama.timeout.stall
+        
+        while tasks:
+            done, _ = await asyncio.wait(tasks, timeout=self.PROGRESS_INTERVAL)
+            for task in done:
+                analyses[tasks.pop(task)] = task.result()
+            if not tasks:
+                break
+            
+            running = list(tasks.values())
+            print(f"[PROGRESS] {progress.render(running)}", file=sys.stderr)
+            for name in progress.stalled(running, stall):
+                print(f"[WARN] {name}: no tokens for {stall:.0f}s, using default analysis",
+                      file=sys.stderr)
+                task = next(t for t, n in tasks.items() if n == name)
+                task.cancel()
+                self.ollama.cancel(cancels[name])
+                del tasks[task]
+                analyses[name] = self.agents[name]._create_default_analysis(feature_request)
+        
+        return [analyses[name] for name in agent_names]
     
     def generate_code_examples(self, results: Dict, output_dir: str):
         """Generate code examples based on analysis"""
-        import os
         os.makedirs(output_dir, exist_ok=True)
         
         feature_request = results['feature_request']
         
         print("[CODE] Generating code examples...")
         
-        # Generate frontend code if any frontend agent (A1 or A2) was involved
-        frontend_agents = [agent for agent in results['agents_involved'] if agent.startswith('Agent-A')]
-        if frontend_agents:
-            self._generate_frontend_code(feature_request, output_dir)
-        
-        # Generate backend code if any backend agent (B1-B4) was involved
-        backend_agents = [agent for agent in results['agents_involved'] if agent.startswith('Agent-B')]
-        if backend_agents:
-            self._generate_backend_code(feature_request, output_dir)
-        
-        # Generate in-car code if any in-car agent (C1-C5) was involved
-        incar_agents = [agent for agent in results['agents_involved'] if agent.startswith('Agent-C')]
-        if incar_agents:
-            self._generate_incar_code(feature_request, output_dir)
+        # Generate code for each layer (frontend A*, backend B*, in-car C*)
+        # that had an agent involved
+        involved = results['agents_involved']
+        artifacts = [
+            artifact for artifact in CODE_ARTIFACTS
+            if any(agent.startswith(artifact.agent_prefix) for agent in involved)
+        ]
+        
+        # Ask for all artifacts in one call; anything missing from the
+        # combined answer is generated on its own. Saving the returned
+        # sections overlaps with those follow-up calls.
+        sections = self._generate_all_code(feature_request, artifacts) if len(artifacts) > 1 else {}
+        asyncio.run(self._run_concurrently([
+            functools.partial(self._write_code, artifact, feature_request, output_dir,
+                              sections[artifact.marker])
+            if artifact.marker in sections else
+            functools.partial(self._generate_code, artifact, feature_request, output_dir)
+            for artifact in artifacts
+        ]))
         
         print(f"[DONE] Code examples saved to {output_dir}/")
     
-    def _generate_frontend_code(self, feature_request: str, output_dir: str):
-        """Generate frontend code examples using AI"""
-        system_prompt = """You are a React Native expert. Generate clean, production-ready code with proper formatting.
-- Use 2-space indentation
-- Add proper imports at the top
-- Use functional components with hooks
-- Include JSDoc comments for main component
-- Format with proper line breaks and spacing
-Output ONLY the code itself with no JSON wrapping, no explanations."""
-        
-        prompt = f"""Generate a well-formatted React Native component for: {feature_request}
-
-Include:
-- All necessary imports (React, useState, useEffect, StyleSheet)
-- JSDoc comment for the component
-- Component with hooks (useState, useEffect)
-- API integration with fetch or axios
-- Real-time WebSocket updates if needed
-- Error handling with try-catch
-- StyleSheet for component styling
-- PropTypes or TypeScript types
-- Export statement
-
-Write complete, properly indented working code:"""
-        
-        code_response = self.ollama.generate(prompt, system_prompt, format_json=False)
+    async def _run_concurrently(self, funcs: List[Callable[[], None]]):
+        """Run blocking callables together on the Ollama client's worker threads"""
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.ollama.executor, func) for func in funcs))
+    
+    def _generate_all_code(self, feature_request: str, artifacts: List["CodeArtifact"]) -> Dict[str, str]:
+        """Generate several artifacts in one call; return marker -> code"""
+        system_prompt = """You are a senior full-stack engineer. Generate clean, production-ready code with proper formatting.
+Output ONLY code with no JSON wrapping and no explanations.
+Start every artifact with its marker line, exactly as given, on a line of its own."""
+        
+        prompt = f"Generate the following artifacts for: {feature_request}\n\n" + "\n\n".join(
+            f"{artifact.marker}\n{artifact.system_prompt}\n\n{artifact.prompt.format(feature_request=feature_request)}"
+            for artifact in artifacts
+        )
+        response = self.ollama.generate(prompt, system_prompt, format=None,
+                                        max_tokens=CODE_MAX_TOKENS * len(artifacts),
+                                        semantic_text=feature_request)
         
+        parts = _CODE_MARKER_RE.split(response)
+        return {f"==={name}===": code for name, code in zip(parts[1::2], parts[2::2]) if code.strip()}
+    
+    def _generate_code(self, artifact: "CodeArtifact", feature_request: str, output_dir: str):
+        """Generate and save one code example using AI"""
+        code_response = self.ollama.generate(
+            artifact.prompt.format(feature_request=feature_request), artifact.system_prompt,
+            format=None, max_tokens=CODE_MAX_TOKENS, semantic_text=feature_request)
+        self._write_code(artifact, feature_request, output_dir, code_response)
+    
+    def _write_code(self, artifact: "CodeArtifact", feature_request: str, output_dir: str,
+                    code_response: str):
+        """Clean up generated code and save it with a header comment"""
         # Clean up code fences if present
-        code = code_response.replace('```javascript', '').replace('```jsx', '').replace('```typescript', '').replace('```', '').strip()
+        code = _CODE_FENCE_RE.sub('', code_response).strip()
         
         # If still wrapped in JSON, try to extract
-        if code.startswith('{') and '"component"' in code:
+        if artifact.json_key and code.startswith('{') and f'"{artifact.json_key}"' in code:
             try:
-                import json
                 data = json.loads(code)
-                code = data.get('component', code)
+                code = data.get(artifact.json_key, code)
             except:
                 pass
         
-        # Ensure proper formatting
-        lines = code.split('\n')
-        formatted_lines = []
-        for line in lines:
-            # Remove excessive blank lines (keep max 1)
-            if line.strip() or (formatted_lines and formatted_lines[-1].strip()):
-                formatted_lines.append(line)
-        
-        formatted_code = '\n'.join(formatted_lines)
-        
-        with open(f"{output_dir}/frontend-component.jsx", 'w') as f:
-            f.write("/**\n")
-            f.write(" * Auto-generated React Native Component\n")
-            f.write(f" * Feature: {feature_request}\n")
-            f.write(" * Generated by AI Agent Orchestrator\n")
-            f.write(" */\n\n")
-            f.write(formatted_code)
-            f.write("\n")  # Ensure file ends with newline
-        
-        print("  [OK] Frontend component example created")
-    
-    def _generate_backend_code(self, feature_request: str, output_dir: str):
-        """Generate backend code examples using AI"""
-        system_prompt = """You are a Node.js/Express expert. Generate clean, production-ready code with proper formatting.
-- Use 2-space indentation
-- Add proper imports/requires at the top
-- Include JSDoc comments for functions
-- Format with proper line breaks and spacing
-Output ONLY the code itself with no JSON wrapping, no explanations."""
+        # Remove excessive blank lines (keep max 1)
+        code = _BLANK_RUN_RE.sub(r"\1", code)
         
-        prompt = f"""Generate well-formatted Node.js backend code for: {feature_request}
-
-Include:
-- All necessary requires (express, mongoose, socket.io)
-- JSDoc comments for main functions
-- Express.js routes with proper HTTP methods
-- MongoDB schema and CRUD operations
-- WebSocket event handlers
-- Input validation (express-validator or joi)
-- Error handling middleware
-- Async/await with try-catch
-- Module exports
-
-Write complete, properly indented working code:"""
+        header = artifact.header.format(feature_request=feature_request)
+        # Ensure file ends with newline
+        Path(output_dir, artifact.filename).write_text(header + code + "\n", encoding="utf-8")
         
-        code_response = self.ollama.generate(prompt, system_prompt, format_json=False)
-        
-        # Clean up code fences
-        code = code_response.replace('```javascript', '').replace('```js', '').replace('```', '').strip()
-        
-        # Format code
-        lines = code.split('\n')
-        formatted_lines = []
-        for line in lines:
-            if line.strip() or (formatted_lines and formatted_lines[-1].strip()):
-                formatted_lines.append(line)
-        
-        formatted_code = '\n'.join(formatted_lines)
-        
-        with open(f"{output_dir}/backend-api.js", 'w') as f:
-            f.write("/**\n")
-            f.write(" * Auto-generated Express API Endpoint\n")
-            f.write(f" * Feature: {feature_request}\n")
-            f.write(" * Generated by AI Agent Orchestrator\n")
-            f.write(" */\n\n")
-            f.write(formatted_code)
-            f.write("\n")
-        
-        print("  [OK] Backend API example created")
-    
-    def _generate_incar_code(self, feature_request: str, output_dir: str):
-        """Generate in-car system code examples using AI"""
-        system_prompt = """You are a Python IoT expert. Generate clean, production-ready code with proper formatting.
-- Use 4-space indentation (PEP 8)
-- Add docstrings for functions and classes
-- Include proper imports at the top
-- Format with proper line breaks and spacing
-Output ONLY the code itself with no JSON wrapping, no explanations."""
-        
-        prompt = f"""Generate well-formatted Python sensor code for: {feature_request}
-
-Include:
-- All necessary imports (redis, json, logging, time, etc.)
-- Module-level docstring
-- Class or functions with docstrings
-- Sensor data reading/simulation logic
-- Redis pub/sub integration
-- JSON data formatting
-- Error handling with try-except
-- Logging configuration and usage
-- Continuous operation loop with proper exit handling
-- Type hints if appropriate
-
-Write complete, properly indented PEP 8 compliant code:"""
-        
-        code_response = self.ollama.generate(prompt, system_prompt, format_json=False)
-        
-        # Clean up code fences
-        code = code_response.replace('```python', '').replace('```py', '').replace('```', '').strip()
-        
-        # Format code
-        lines = code.split('\n')
-        formatted_lines = []
-        for line in lines:
-            if line.strip() or (formatted_lines and formatted_lines[-1].strip()):
-                formatted_lines.append(line)
-        
-        formatted_code = '\n'.join(formatted_lines)
-        
-        with open(f"{output_dir}/sensor-integration.py", 'w') as f:
-            f.write('"""\n')
-            f.write("Auto-generated Python Sensor Integration\n")
-            f.write(f"Feature: {feature_request}\n")
-            f.write("Generated by AI Agent Orchestrator\n")
-            f.write('"""\n\n')
-            f.write(formatted_code)
-            f.write("\n")
-        
-        print("  [OK] Sensor integration example created")
+        print(f"  [OK] {artifact.label} example created")
     
     def generate_ui_mockup(self, results: Dict, output_dir: str):
         """Generate UI description/mockup with ASCII art"""
-        import os
         os.makedirs(output_dir, exist_ok=True)
         
         feature_request = results['feature_request']
@@ -589,289 +990,240 @@ Provide a detailed specification including:
 
 Be specific and detailed."""
         
-        ui_details = self.ollama.generate(prompt, format_json=False)
+        ui_details = self.ollama.generate(prompt, format=None, max_tokens=UI_SPEC_MAX_TOKENS,
+                                          semantic_text=feature_request)
         
         # Create ASCII art mockup using box-drawing characters
         mockup = self._create_ascii_mockup(feature_request)
         
-        with open(f"{output_dir}/ui-design-spec.md", 'w') as f:
-            f.write(f"# UI Design Specification\n\n")
-            f.write(f"**Feature**: {feature_request}\n\n")
-            f.write("## Screen Mockup\n\n")
-            f.write("```\n")
-            f.write(mockup)
-            f.write("\n```\n\n")
-            f.write("## Design Details\n\n")
-            f.write(ui_details)
-            f.write("\n\n---\n\n")
-            f.write("*Generated by AI Agent Orchestrator*\n")
+        spec = (
+            "# UI Design Specification\n\n"
+            f"**Feature**: {feature_request}\n\n"
+            "## Screen Mockup\n\n"
+            f"```\n{mockup}\n```\n\n"
+            "## Design Details\n\n"
+            f"{ui_details}\n\n---\n\n"
+            "*Generated by AI Agent Orchestrator*\n"
+        )
+        Path(output_dir, "ui-design-spec.md").write_text(spec, encoding="utf-8")
         
         print(f"  [OK] UI design spec saved")
     
     def _create_ascii_mockup(self, feature: str) -> str:
         """Create ASCII art mockup using box-drawing characters"""
-        width = 70
-        
-        mockup = []
-        
         # Check if feature is tire/pressure related
-        is_tire_feature = any(word in feature.lower() for word in ['tire', 'tyre', 'pressure', 'wheel'])
-        
-        if is_tire_feature:
-            # Tire pressure specific mockup
-            mockup.append("+------------------------------------------------------------------+")
-            mockup.append("|                    TIRE PRESSURE MONITOR                         |")
-            mockup.append("+------------------------------------------------------------------+")
-            mockup.append("|                                                                  |")
-            mockup.append("|        FRONT LEFT              |             FRONT RIGHT         |")
-            mockup.append("|       .-'''''''-.              |            .-'''''''-.          |")
-            mockup.append("|      /           \\             |           /           \\         |")
-            mockup.append("|     |             |            |          |             |        |")
-            mockup.append("|     | [=======   ]|            |          | [========= ]|        |")
-            mockup.append("|     |   2.2 bar   |            |          |   2.2 bar   |        |")
-            mockup.append("|      \\           /             |           \\           /          |")
-            mockup.append("|       '-.......-'              |            '-.......-'           |")
-            mockup.append("|         [OK]                   |              [OK]               |")
-            mockup.append("|                                |                                 |")
-            mockup.append("|--------------------------------+-------------------------------- |")
-            mockup.append("|                                                                  |")
-            mockup.append("|        REAR LEFT               |             REAR RIGHT          |")
-            mockup.append("|       .-'''''''-.              |            .-'''''''-.          |")
-            mockup.append("|      /           \\             |           /           \\         |")
-            mockup.append("|     |             |            |          |             |        |")
-            mockup.append("|     | [======    ]|            |          | [====      ]|        |")
-            mockup.append("|     |   2.1 bar   |            |          |   1.9 bar   |        |")
-            mockup.append("|      \\           /             |           \\           /          |")
-            mockup.append("|       '-.......-'              |            '-.......-'           |")
-            mockup.append("|         [OK]                   |             [LOW!]              |")
-            mockup.append("|                                                                  |")
-            mockup.append("+------------------------------------------------------------------+")
-            mockup.append("| Status: 1 tire low pressure    | Last Update: 2 seconds ago      |")
-            mockup.append("+------------------------------------------------------------------+")
-            mockup.append("| [Refresh] [History] [Alerts] [Settings]                          |")
-            mockup.append("+------------------------------------------------------------------+")
-        else:
-            # Generic feature mockup
-            mockup.append("+------------------------------------------------------------------+")
-            mockup.append("|  " + feature[:62].center(62) + "  |")
-            mockup.append("+------------------------------------------------------------------+")
-            mockup.append("|  [Home]  [Dashboard]  [Settings]  [Profile]                      |")
-            mockup.append("+------------------------------------------------------------------+")
-            mockup.append("|                                                                  |")
-            mockup.append("|  Main Content Area:                                              |")
-            mockup.append("|                                                                  |")
-            mockup.append("|  +------------------------------------------------------------+  |")
-            mockup.append("|  | Data Display / Visualization                              |  |")
-            mockup.append("|  |                                                            |  |")
-            mockup.append("|  | [=============>            ] 60%                           |  |")
-            mockup.append("|  |                                                            |  |")
-            mockup.append("|  +------------------------------------------------------------+  |")
-            mockup.append("|                                                                  |")
-            mockup.append("|  +------------------------------------------------------------+  |")
-            mockup.append("|  | Interactive Controls                                       |  |")
-            mockup.append("|  |                                                            |  |")
-            mockup.append("|  |   [Start]    [Stop]    [Refresh]    [Export]              |  |")
-            mockup.append("|  |                                                            |  |")
-            mockup.append("|  +------------------------------------------------------------+  |")
-            mockup.append("|                                                                  |")
-            mockup.append("+------------------------------------------------------------------+")
-            mockup.append("| Status: Active         | Updated: Just now    | Users: 142       |")
-            mockup.append("+------------------------------------------------------------------+")
-        
-        return "\n".join(mockup)
+        if any(word in feature.lower() for word in ['tire', 'tyre', 'pressure', 'wheel']):
+            return _TIRE_MOCKUP
+        return _GENERIC_MOCKUP.format(title=feature[:62].center(62))
     
     def format_analysis_output(self, results: Dict) -> str:
         """Format analysis results with ASCII box-drawing characters"""
-        lines = []
-        
         # Header
         feature = results.get('feature_request', 'Unknown Feature')
         header_width = max(70, len(feature) + 10)
-        
-        lines.append("+" + "-" * (header_width - 2) + "+")
-        
-        # Center "Feature Request"
-        title = "Feature Request"
-        title_padding = (header_width - len(title) - 2) // 2
-        lines.append("|" + " " * title_padding + title + " " * (header_width - len(title) - title_padding - 2) + "|")
-        
-        # Center the feature name with quotes
-        feature_text = f'"{feature}"'
-        feature_padding = (header_width - len(feature_text) - 2) // 2
-        lines.append("|" + " " * feature_padding + feature_text + " " * (header_width - len(feature_text) - feature_padding - 2) + "|")
-        
-        lines.append("+" + "-" * (header_width - 2) + "+")
+        w = header_width - 2  # Width inside the box
+        border = "+" + "-" * w + "+"
+        row = f"|{{:<{w}}}|".format
+        centered = f"|{{:^{w}}}|".format
         
         # Summary section
         agents_count = len(results.get('agents_involved', []))
         total_effort = results.get('total_effort_hours', 0)
         
-        lines.append("|" + f" Agents Involved: {agents_count}".ljust(header_width - 2) + "|")
-        lines.append("|" + f" Total Effort: {total_effort} hours".ljust(header_width - 2) + "|")
-        lines.append("+" + "-" * (header_width - 2) + "+")
-        
-        # Agent orchestration tree
-        lines.append("|" + " Agent Orchestration Flow".ljust(header_width - 2) + "|")
-        lines.append("+" + "-" * (header_width - 2) + "+")
-        
-        if results.get('call_tree'):
-            for call in results['call_tree']:
-                indent_str = "  " * call['level']
-                tree_line = f" {indent_str}+-- {call['agent']}"
-                lines.append("|" + tree_line.ljust(header_width - 2) + "|")
-        
-        lines.append("+" + "-" * (header_width - 2) + "+")
+        sections = [
+            border,
+            # Center "Feature Request" and the quoted feature name
+            centered("Feature Request"),
+            centered(f'"{feature}"'),
+            border,
+            row(f" Agents Involved: {agents_count}"),
+            row(f" Total Effort: {total_effort} hours"),
+            border,
+            # Agent orchestration tree
+            row(" Agent Orchestration Flow"),
+            border,
+        ]
+        sections.extend(
+            row(f" {'  ' * call['level']}+-- {call['agent']}")
+            for call in results.get('call_tree', [])
+        )
+        sections.append(border)
         
         # Individual agent analyses
         for agent_name in results.get('agents_involved', []):
-            agent_key = agent_name.lower().replace("-", "_")
+            agent_key = _analysis_key(agent_name)
             if agent_key not in results.get("analyses", {}):
                 continue
-            
-            analysis = results["analyses"][agent_key]
-            agent = self.agents.get(agent_name)
-            
-            # Agent header
-            role = agent.role if agent else "Unknown Role"
-            component = agent.component if agent else "Unknown Component"
-            lines.append("|" + f" [AI] {agent_name} - {role}".ljust(header_width - 2) + "|")
-            lines.append("|" + f" Component: {component}".ljust(header_width - 2) + "|")
-            
-            # Impact and effort
-            impact = analysis.get('impact', 'N/A')
-            effort = analysis.get('effort_hours', 0)
-            lines.append("|" + f" Impact: {impact}"[:header_width - 3].ljust(header_width - 2) + "|")
-            lines.append("|" + f" Effort: {effort} hours".ljust(header_width - 2) + "|")
-            
-            # Changes needed
-            if analysis.get('changes'):
-                lines.append("|" + " Changes:".ljust(header_width - 2) + "|")
-                for change in analysis.get('changes', [])[:3]:  # Limit to 3 changes for display
-                    change_line = f"   - {change}"[:header_width - 3]
-                    lines.append("|" + change_line.ljust(header_width - 2) + "|")
-            
-            # Downstream dependencies
-            if agent and agent.downstream_agents:
-                deps_needed = []
-                for downstream in agent.downstream_agents:
-                    agent_key_dep = f"needs_{downstream.lower().replace('-', '_')}"
-                    if analysis.get(agent_key_dep, False):
-                        deps_needed.append(downstream)
-                
-                if deps_needed:
-                    deps_line = f" Needs: {', '.join(deps_needed)}"[:header_width - 3]
-                    lines.append("|" + deps_line.ljust(header_width - 2) + "|")
-            
-            lines.append("+" + "-" * (header_width - 2) + "+")
+            sections.append(self._format_agent_box(agent_name, results["analyses"][agent_key], w))
+            sections.append(border)
         
         # Footer
-        lines.append("|" + " Analysis generated by AI Agent Orchestrator".ljust(header_width - 2) + "|")
-        lines.append("+" + "-" * (header_width - 2) + "+")
+        sections.append(row(" Analysis generated by AI Agent Orchestrator"))
+        sections.append(border)
         
-        return "\n".join(lines)
+        return "\n".join(sections)
+    
+    def _format_agent_box(self, agent_name: str, analysis: Dict, w: int) -> str:
+        """Format one agent's analysis as rows of the ASCII summary box"""
+        agent = self.agents.get(agent_name)
+        role = agent.role if agent else "Unknown Role"
+        component = agent.component if agent else "Unknown Component"
+        impact = analysis.get('impact', 'N/A')
+        effort = analysis.get('effort_hours', 0)
+        
+        rows = [
+            f" [AI] {agent_name} - {role}",
+            f" Component: {component}",
+            f" Impact: {impact}"[:w - 1],
+            f" Effort: {effort} hours",
+        ]
+        
+        # Changes needed, limited to 3 for display
+        changes = analysis.get('changes')
+        if changes:
+            rows.append(" Changes:")
+            rows.extend(f"   - {change}"[:w - 1] for change in changes[:3])
+        
+        # Downstream dependencies
+        if agent and agent.downstream_agents:
+            deps_needed = [
+                downstream
+                for downstream, agent_key in zip(agent.downstream_agents, agent.needs_keys)
+                if analysis.get(agent_key, False)
+            ]
+            if deps_needed:
+                rows.append(f" Needs: {', '.join(deps_needed)}"[:w - 1])
+        
+        return "\n".join(map(f"|{{:<{w}}}|".format, rows))
 
+    @staticmethod
+    def _format_bullets(title: str, items: List[str]) -> str:
+        """Format a bold-titled markdown bullet list, or "" when empty"""
+        if not items:
+            return ""
+        return f"**{title}**:\n" + "".join(f"- {item}\n" for item in items) + "\n"
+    
+    def _format_agent_section(self, agent_name: str, analysis: Dict) -> str:
+        """Format one agent's analysis as a markdown report section"""
+        agent = self.agents.get(agent_name)
+        parts = []
+        
+        if agent:
+            parts.append(f"## {agent_name} - {agent.component}\n\n")
+            parts.append(f"**Role**: {agent.role}\n\n")
+            parts.append(f"**APIs Provided**: {', '.join(agent.apis) if agent.apis else 'None'}\n\n")
+        else:
+            parts.append(f"## {agent_name}\n\n")
+        
+        parts.append(f"**Impact**: {analysis.get('impact', 'N/A')}\n\n")
+        parts.append(self._format_bullets("Components Affected", analysis.get('components')))
+        parts.append(self._format_bullets("Required Changes", analysis.get('changes')))
+        parts.append(f"**Estimated Effort**: {analysis.get('effort_hours', 0)} hours\n\n")
+        parts.append(self._format_bullets("Risks", analysis.get('risks')))
+        
+        # Show downstream dependencies
+        if agent and agent.downstream_agents:
+            statuses = []
+            for downstream, agent_key in zip(agent.downstream_agents, agent.needs_keys):
+                needed = analysis.get(agent_key, False)
+                statuses.append(f"{downstream}: {'[OK] Required' if needed else '[SKIP] Not needed'}")
+            parts.append(self._format_bullets("Downstream Dependencies", statuses))
+        
+        parts.append("---\n\n")
+        return "".join(parts)
+    
     def generate_report(self, results: Dict, output_file: str):
         """Generate markdown report from analysis results"""
-        with open(output_file, 'w') as f:
-            f.write(f"# AI-Driven Feature Analysis Report\n\n")
-            f.write(f"**Feature Request**: {results['feature_request']}\n\n")
-            f.write(f"**Agents Involved**: {', '.join(results['agents_involved'])}\n\n")
-            f.write(f"**Total Estimated Effort**: {results['total_effort_hours']} hours\n\n")
-            
-            # Show agent call tree
-            if results.get('call_tree'):
-                f.write("## Agent Orchestration Flow\n\n")
-                f.write("```\n")
-                for call in results['call_tree']:
-                    indent = "  " * call['level']
-                    f.write(f"{indent}└─ {call['agent']}\n")
-                f.write("```\n\n")
-            
-            f.write("---\n\n")
-            
-            # Write analysis for each agent
-            for agent_name in results['agents_involved']:
-                agent_key = agent_name.lower().replace("-", "_")
-                if agent_key not in results["analyses"]:
-                    continue
-                
-                analysis = results["analyses"][agent_key]
-                agent = self.agents.get(agent_name)
-                
-                if agent:
-                    f.write(f"## {agent_name} - {agent.component}\n\n")
-                    f.write(f"**Role**: {agent.role}\n\n")
-                    f.write(f"**APIs Provided**: {', '.join(agent.apis) if agent.apis else 'None'}\n\n")
-                else:
-                    f.write(f"## {agent_name}\n\n")
-                
-                f.write(f"**Impact**: {analysis.get('impact', 'N/A')}\n\n")
-                
-                if analysis.get('components'):
-                    f.write("**Components Affected**:\n")
-                    for comp in analysis.get('components', []):
-                        f.write(f"- {comp}\n")
-                    f.write("\n")
-                
-                if analysis.get('changes'):
-                    f.write("**Required Changes**:\n")
-                    for change in analysis.get('changes', []):
-                        f.write(f"- {change}\n")
-                    f.write("\n")
-                
-                f.write(f"**Estimated Effort**: {analysis.get('effort_hours', 0)} hours\n\n")
-                
-                if analysis.get('risks'):
-                    f.write("**Risks**:\n")
-                    for risk in analysis.get('risks', []):
-                        f.write(f"- {risk}\n")
-                    f.write("\n")
-                
-                # Show downstream dependencies
-                if agent and agent.downstream_agents:
-                    f.write("**Downstream Dependencies**:\n")
-                    for downstream in agent.downstream_agents:
-                        agent_key = f"needs_{downstream.lower().replace('-', '_')}"
-                        needed = analysis.get(agent_key, False)
-                        status = "[OK] Required" if needed else "[SKIP] Not needed"
-                        f.write(f"- {downstream}: {status}\n")
-                    f.write("\n")
-                
-                f.write("---\n\n")
-            
-            f.write("## Summary\n\n")
-            f.write(f"This hierarchical analysis was generated dynamically using AI.\n\n")
-            f.write(f"- **Total agents involved**: {len(results['agents_involved'])}\n")
-            f.write(f"- **Total effort**: {results['total_effort_hours']} hours\n")
-            f.write(f"- **Analysis approach**: Each agent only sees downstream agent APIs\n")
+        parts = [
+            "# AI-Driven Feature Analysis Report\n\n",
+            f"**Feature Request**: {results['feature_request']}\n\n",
+            f"**Agents Involved**: {', '.join(results['agents_involved'])}\n\n",
+            f"**Total Estimated Effort**: {results['total_effort_hours']} hours\n\n",
+        ]
+        
+        # Show agent call tree
+        if results.get('call_tree'):
+            parts.append("## Agent Orchestration Flow\n\n```\n")
+            for call in results['call_tree']:
+                parts.append(f"{'  ' * call['level']}└─ {call['agent']}\n")
+            parts.append("```\n\n")
+        
+        parts.append("---\n\n")
+        
+        # Write analysis for each agent
+        for agent_name in results['agents_involved']:
+            agent_key = _analysis_key(agent_name)
+            if agent_key in results["analyses"]:
+                parts.append(self._format_agent_section(agent_name, results["analyses"][agent_key]))
+        
+        parts.append("## Summary\n\n")
+        parts.append("This hierarchical analysis was generated dynamically using AI.\n\n")
+        parts.append(f"- **Total agents involved**: {len(results['agents_involved'])}\n")
+        parts.append(f"- **Total effort**: {results['total_effort_hours']} hours\n")
+        parts.append("- **Analysis approach**: Each agent only sees downstream agent APIs\n")
+        
+        # Build the whole report in memory and write it in one go, as UTF-8
+        # regardless of the build agent's locale (the call tree uses box drawing)
+        Path(output_file).write_bytes("".join(parts).encode("utf-8"))
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: ai-agent-orchestrator.py '<feature_request>' [output_file] [ollama_host] [model]")
-        sys.exit(1)
-    
-    feature_request = sys.argv[1]
-    output_file = sys.argv[2] if len(sys.argv) > 2 else "analysis-report.md"
-    ollama_host = sys.argv[3] if len(sys.argv) > 3 else "http://10.0.2.2:11434"
-    model = sys.argv[4] if len(sys.argv) > 4 else "llama3:8b"
+    # --no-cache may appear anywhere; everything else is positional
+    use_cache = "--no-cache" not in sys.argv[1:]
+    args = [arg for arg in sys.argv[1:] if arg != "--no-cache"]
     
-    # Create orchestrator and run analysis
-    orchestrator = AgentOrchestrator(ollama_host, model)
-    results = orchestrator.orchestrate(feature_request)
+    if len(args) < 1:
+        print("Usage: ai-agent-orchestrator.py '<feature_request>' [output_file] [ollama_host] [model] [--no-cache]")
+        sys.exit(1)
     
-    # Generate report
-    orchestrator.generate_report(results, output_file)
+    feature_request = args[0]
+    output_file = args[1] if len(args) > 1 else "analysis-report.md"
+    ollama_host = args[2] if len(args) > 2 else "http://10.0.2.2:11434"
+    model = args[3] if len(args) > 3 else "llama3:8b"
     
-    # Display formatted analysis
-    print("\n" + orchestrator.format_analysis_output(results))
+    logging.basicConfig(
+        level=os.environ.get("ORCHESTRATOR_LOG_LEVEL", "WARNING").upper(),
+        format="%(message)s",
+        stream=sys.stderr
+    )
     
-    # Output JSON for Jenkins to parse
-    print("\n" + "="*50)
-    print("JSON Results:")
-    print(json.dumps(results, indent=2))
+    # Create orchestrator and run analysis; it is closed once every step is done
+    with AgentOrchestrator(ollama_host, model, use_cache=use_cache) as orchestrator:
+        # Stop now rather than letting every agent call time out
+        try:
+            orchestrator.ollama.ping()
+        except RuntimeError as e:
+            print(f"[ERROR] {e}", file=sys.stderr)
+            sys.exit(1)
+        # Let the model load in the background; the first agent call simply
+        # queues behind it on the server instead of waiting for a round-trip
+        orchestrator.ollama.executor.submit(orchestrator.ollama.warmup)
+        results = orchestrator.orchestrate(feature_request)
+        
+        # Generate report
+        orchestrator.generate_report(results, output_file)
+        
+        # Display formatted analysis
+        print("\n" + orchestrator.format_analysis_output(results))
+        
+        # Encode the results once: compact JSON for Jenkins to parse from the
+        # log, and the same bytes saved next to the report
+        results_json = json_dumps_bytes(results)
+        json_file = Path(output_file).with_suffix(".json")
+        json_file.write_bytes(results_json)
+        
+        print("\n" + "="*50)
+        print("JSON Results:", flush=True)
+        sys.stdout.buffer.write(results_json + b"\n")
+        sys.stdout.buffer.flush()
+        
+        if orchestrator.ollama.cache:
+            cache = orchestrator.ollama.cache
+            print(f"[CACHE] {cache.hits} hits, {cache.misses} misses", file=sys.stderr)
+        print(f"[METRICS] {orchestrator.ollama.metrics_summary()}", file=sys.stderr)
     
     print(f"\n[OK] Analysis complete!")
     print(f"  [DOC] Report: {output_file}")
+    print(f"  [DOC] JSON: {json_file}")
 
 if __name__ == "__main__":
     main()
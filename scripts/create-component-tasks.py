@@ -13,13 +13,17 @@ import argparse
 import os
 import re
 import sys
+from itertools import accumulate
 
 COMPONENTS = ["A1","A2","B1","B2","B3","B4","C1","C2","C5"]
 
-# Component technology stacks and code templates
+MAX_EXCERPTS = 3  # Analysis excerpts shown per task file
+
+# Component technology stacks, code templates and their code fence language
 COMPONENT_INFO = {
     "A1": {
         "tech": "React Native (Mobile)",
+        "lang": "javascript",
         "template": """// Example: Add new screen/component
 import React, { useState, useEffect } from 'react';
 import { View, Text, StyleSheet } from 'react-native';
@@ -47,6 +51,7 @@ const styles = StyleSheet.create({
     },
     "A2": {
         "tech": "React (Web)",
+        "lang": "javascript",
         "template": """// Example: Add new component
 import React, { useState, useEffect } from 'react';
 import './TirePressureDashboard.css';
@@ -75,6 +80,7 @@ export default function TirePressureDashboard() {
     },
     "B1": {
         "tech": "Node.js/Express (REST API)",
+        "lang": "javascript",
         "template": """// Example: Add new API endpoint
 const express = require('express');
 const router = express.Router();
@@ -110,6 +116,7 @@ module.exports = router;"""
     },
     "B2": {
         "tech": "Node.js/WebSocket (IoT Gateway)",
+        "lang": "javascript",
         "template": """// Example: WebSocket handler for real-time data
 const WebSocket = require('ws');
 const wss = new WebSocket.Server({ port: 3002 });
@@ -176,6 +183,7 @@ db.cars.find({
     },
     "B4": {
         "tech": "PostgreSQL (Static Database)",
+        "lang": "sql",
         "template": """-- Example: Database schema and migrations
 -- Table: cars
 CREATE TABLE cars (
@@ -209,6 +217,7 @@ GROUP BY c.license_plate, c.make, c.model;"""
     },
     "C1": {
         "tech": "Python asyncio (Cloud Communication)",
+        "lang": "python",
         "template": """# Example: Cloud communication module
 import asyncio
 import websockets
@@ -279,6 +288,7 @@ for message in pubsub.listen():
     },
     "C5": {
         "tech": "Python (Sensor Simulation)",
+        "lang": "python",
         "template": """# Example: Tire pressure sensor simulator
 import time
 import random
@@ -333,23 +343,64 @@ if __name__ == '__main__':
 }
 
 
-def excerpt_for_component(text_lines, token, context=5):
-    matches = []
+# Boilerplate closing every task file
+SUBTASKS = """## Suggested Subtasks
+
+- [ ] Review analysis excerpt and understand requirements
+- [ ] Adapt the code template to specific feature needs
+- [ ] Investigate required interface changes (APIs, events, DB)
+- [ ] Implement changes in a small, well-scoped PR
+- [ ] Add/adjust unit and integration tests
+- [ ] Update API documentation if needed
+- [ ] Create CI/CD/deployment notes if needed
+"""
+
+NOTES = """
+## Notes
+
+- Component: {comp}
+- Effort: _(estimate from analysis)_
+- Dependencies: _(list upstream/downstream components)_
+- API Endpoints: _(if applicable)_
+- Data Models: _(if applicable)_
+"""
+
+# One alternation over every component name, so the report is scanned once
+# for all of them instead of once per component
+COMPONENT_RE = re.compile("|".join(re.escape(comp) for comp in COMPONENTS))
+
+
+def find_component_lines(text_lines, max_matches=MAX_EXCERPTS):
+    """Map each component to the first lines (indexes) that mention it
+
+    Scanning stops once every component has max_matches lines.
+    """
+    found = {comp: [] for comp in COMPONENTS}
+    remaining = len(COMPONENTS)
     for i, line in enumerate(text_lines):
-        if token in line:
-            start = max(0, i - context)
-            end = min(len(text_lines), i + context + 1)
-            excerpt = "".join(text_lines[start:end]).strip()
-            matches.append((i, excerpt))
-    # fall back: if no direct match, try word-boundary search
-    if not matches:
-        pattern = re.compile(r"\b" + re.escape(token) + r"\b")
-        for i, line in enumerate(text_lines):
-            if pattern.search(line):
-                start = max(0, i - context)
-                end = min(len(text_lines), i + context + 1)
-                excerpt = "".join(text_lines[start:end]).strip()
-                matches.append((i, excerpt))
+        for comp in set(COMPONENT_RE.findall(line)):
+            hits = found[comp]
+            if len(hits) < max_matches:
+                hits.append(i)
+                if len(hits) == max_matches:
+                    remaining -= 1
+        if not remaining:
+            break
+    return found
+
+
+def excerpt_for_component(text, line_offsets, line_numbers, context=5):
+    """Slice the lines around each match out of the report text
+
+    line_offsets holds the start of every line plus the end of the text.
+    """
+    matches = []
+    last_line = len(line_offsets) - 1
+    for i in line_numbers:
+        start = max(0, i - context)
+        end = min(last_line, i + context + 1)
+        excerpt = text[line_offsets[start]:line_offsets[end]].strip()
+        matches.append((i, excerpt))
     return matches
 
 
@@ -368,58 +419,44 @@ def main():
     with open(args.analysis_md, 'r', encoding='utf-8', errors='replace') as f:
         lines = f.readlines()
 
+    text = "".join(lines)
+    line_offsets = [0, *accumulate(map(len, lines))]
+    component_lines = find_component_lines(lines)
+
     created = 0
     for comp in COMPONENTS:
-        matches = excerpt_for_component(lines, comp)
+        matches = excerpt_for_component(text, line_offsets, component_lines[comp])
         comp_info = COMPONENT_INFO.get(comp, {})
         
+        parts = [
+            f"# Task: {comp}\n\n",
+            f"**Component**: {comp}\n",
+            f"**Technology**: {comp_info.get('tech', 'N/A')}\n\n",
+            f"Generated from analysis: `{os.path.basename(args.analysis_md)}`\n\n",
+        ]
+
+        if matches:
+            parts.append("## Analysis Excerpt\n\n```")
+            parts.append('\n---\n'.join(excerpt for _, excerpt in matches))
+            parts.append("\n```\n")
+        else:
+            parts.append("## Analysis Excerpt\n\n")
+            parts.append("No direct excerpt found for component. Please review the analysis and add details.\n\n")
+
+        # Add source code proposal
+        if comp_info.get('template'):
+            parts.append('## Proposed Implementation\n\n')
+            parts.append(f"### Example Code for {comp}\n\n")
+            parts.append(f"```{comp_info.get('lang', '')}\n{comp_info['template']}\n```\n\n")
+            parts.append('**Note**: This is a template example. Adapt it based on the specific feature requirements from the analysis.\n\n')
+
+        parts.append(SUBTASKS)
+        parts.append(NOTES.format(comp=comp))
+
+        # Each task file is assembled in memory and written in one go
         filename = os.path.join(args.out_dir, f"task-{comp}.md")
         with open(filename, 'w', encoding='utf-8') as out:
-            out.write(f"# Task: {comp}\n\n")
-            out.write(f"**Component**: {comp}\n")
-            out.write(f"**Technology**: {comp_info.get('tech', 'N/A')}\n\n")
-            out.write(f"Generated from analysis: `{os.path.basename(args.analysis_md)}`\n\n")
-            
-            if matches:
-                out.write("## Analysis Excerpt\n\n```")
-                # include up to 3 matches
-                for idx, (lineno, excerpt) in enumerate(matches[:3]):
-                    out.write(excerpt)
-                    if idx != min(2, len(matches)-1):
-                        out.write('\n---\n')
-                out.write("\n```\n")
-            else:
-                out.write("## Analysis Excerpt\n\n")
-                out.write("No direct excerpt found for component. Please review the analysis and add details.\n\n")
-
-            # Add source code proposal
-            if comp_info.get('template'):
-                out.write('## Proposed Implementation\n\n')
-                out.write(f"### Example Code for {comp}\n\n")
-                out.write('```python' if comp in ['C1', 'C5'] else 
-                         '```sql' if comp == 'B4' else
-                         '```javascript' if comp in ['A1', 'A2', 'B1', 'B2'] else
-                         '```')
-                out.write('\n')
-                out.write(comp_info['template'])
-                out.write('\n```\n\n')
-                out.write('**Note**: This is a template example. Adapt it based on the specific feature requirements from the analysis.\n\n')
-
-            out.write('## Suggested Subtasks\n\n')
-            out.write('- [ ] Review analysis excerpt and understand requirements\n')
-            out.write('- [ ] Adapt the code template to specific feature needs\n')
-            out.write('- [ ] Investigate required interface changes (APIs, events, DB)\n')
-            out.write('- [ ] Implement changes in a small, well-scoped PR\n')
-            out.write('- [ ] Add/adjust unit and integration tests\n')
-            out.write('- [ ] Update API documentation if needed\n')
-            out.write('- [ ] Create CI/CD/deployment notes if needed\n')
-
-            out.write('\n## Notes\n\n')
-            out.write(f'- Component: {comp}\n')
-            out.write('- Effort: _(estimate from analysis)_\n')
-            out.write('- Dependencies: _(list upstream/downstream components)_\n')
-            out.write('- API Endpoints: _(if applicable)_\n')
-            out.write('- Data Models: _(if applicable)_\n')
+            out.write("".join(parts))
 
         created += 1
 
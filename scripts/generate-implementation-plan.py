@@ -8,162 +8,209 @@ import json
 import os
 import sys
 
+try:
+    import orjson  # Optional: faster parsing of large agent logs
+except ImportError:
+    orjson = None
+
+JSON_MARKER = b'JSON Results:'
+TAIL_CHUNK = 64 * 1024  # Bytes read per step when searching the log backwards
+
+# Fixed plan sections that do not depend on the analysis
+TESTING_AND_DEPLOYMENT = """### Phase 3: Testing & Quality Assurance
+
+**Objective**: Ensure feature works correctly end-to-end
+
+**Tasks**:
+- [ ] Unit tests for backend APIs
+- [ ] Integration tests for data flow
+- [ ] Frontend component tests
+- [ ] End-to-end user flow testing
+- [ ] Performance testing
+- [ ] Security review
+
+**Estimated Effort**: 4-8 hours
+
+---
+
+### Phase 4: Deployment
+
+**Objective**: Roll out feature to production
+
+**Tasks**:
+- [ ] Deploy backend services
+- [ ] Update database migrations
+- [ ] Deploy frontend updates
+- [ ] Monitor system health
+- [ ] Document new feature
+- [ ] Train support team
+
+**Estimated Effort**: 2-4 hours
+
+---
+
+"""
+
+# Closes the recommended team list of the summary
+SUMMARY_FOOTER = """- QA Engineer
+- DevOps Engineer
+
+**Prerequisites**:
+- Development environment set up
+- Access to all required services
+- Test data available
+- Code review process in place
+
+**Success Metrics**:
+- All tests passing
+- Feature meets acceptance criteria
+- No performance degradation
+- Documentation complete
+"""
+
+def read_from_marker(log_file):
+    """Return the log from its last JSON_MARKER on, or None if there is none.
+    
+    The results are printed at the end of the run, so the log is searched
+    backwards a chunk at a time and the text before the marker is never read.
+    """
+    with open(log_file, 'rb') as f:
+        pos = f.seek(0, os.SEEK_END)
+        while pos > 0:
+            chunk_start = max(0, pos - TAIL_CHUNK)
+            f.seek(chunk_start)
+            # Overlap the previous chunk so a marker split between them is found
+            chunk = f.read(pos - chunk_start + len(JSON_MARKER) - 1)
+            marker = chunk.rfind(JSON_MARKER)
+            if marker != -1:
+                f.seek(chunk_start + marker)
+                return f.read()
+            pos = chunk_start
+    return None
+
 def extract_json_from_log(log_file):
     """Extract JSON data from agent log file."""
     if not os.path.exists(log_file):
         return None
     
-    with open(log_file, 'r') as f:
-        content = f.read()
+    # Raw bytes; the JSON parsers decode only the block they are given
+    content = read_from_marker(log_file)
+    if content is None:
+        return None
         
     # Find JSON block in the log
-    if '"feature_request"' not in content:
-        return None
-    
-    start = content.find('{', content.find('JSON Results:'))
+    start = content.find(b'{')
     if start == -1:
         return None
     
-    # Find matching closing brace
+    # Find matching closing brace, hopping from one '}' to the next and
+    # counting the '{' in between instead of stepping through every byte
     brace_count = 0
-    end = start
-    for i in range(start, len(content)):
-        if content[i] == '{':
-            brace_count += 1
-        elif content[i] == '}':
-            brace_count -= 1
-            if brace_count == 0:
-                end = i + 1
-                break
-    
-    json_str = content[start:end]
+    pos = start
+    while True:
+        end = content.find(b'}', pos)
+        if end == -1:
+            return None
+        brace_count += content.count(b'{', pos, end) - 1
+        pos = end + 1
+        if brace_count == 0:
+            break
+    
+    # Only the orchestrator's results object is accepted
+    json_str = content[start:pos]
+    if b'"feature_request"' not in json_str:
+        return None
     try:
+        if orjson is not None:
+            return orjson.loads(json_str)
         return json.loads(json_str)
-    except json.JSONDecodeError:
+    except ValueError:  # Also covers invalid UTF-8
         return None
 
 def generate_implementation_plan(json_data, output_file):
     """Generate implementation plan markdown from analysis data."""
+    parts = [
+        "# Implementation Plan\n\n",
+        f"**Feature**: {json_data.get('feature_request', 'Unknown')}\n\n",
+        f"**Total Estimated Effort**: {json_data.get('total_effort_hours', 0)} hours\n\n",
+        "---\n\n",
+        "## Implementation Phases\n\n",
+    ]
     
-    with open(output_file, 'w') as f:
-        f.write("# Implementation Plan\n\n")
-        f.write(f"**Feature**: {json_data.get('feature_request', 'Unknown')}\n\n")
-        f.write(f"**Total Estimated Effort**: {json_data.get('total_effort_hours', 0)} hours\n\n")
-        
-        f.write("---\n\n")
-        f.write("## Implementation Phases\n\n")
-        
-        # Organize by component layers
-        agents = json_data.get('agents_involved', [])
-        analyses = json_data.get('analyses', {})
+    # Organize by component layers in one pass
+    agents = json_data.get('agents_involved', [])
+    analyses = json_data.get('analyses', {})
+    backend_agents = []
+    frontend_agents = []
+    layers = set()  # 'Agent-A'/'Agent-B'/'Agent-C' when any agent of that layer took part
+    for agent in agents:
+        layer = agent[:7]
+        if layer in ('Agent-B', 'Agent-C'):
+            phase = backend_agents
+        elif layer == 'Agent-A':
+            phase = frontend_agents
+        else:
+            continue
+        layers.add(layer)
+        phase.append((agent, analyses.get(agent.lower().replace('-', '_'), {})))
+    
+    # Phase 1: Backend/Database setup
+    if backend_agents:
+        parts.append("### Phase 1: Backend & Data Layer\n\n")
+        parts.append("**Objective**: Set up backend APIs, databases, and data infrastructure\n\n")
         
-        # Phase 1: Backend/Database setup
-        backend_agents = [a for a in agents if a.startswith('Agent-B') or a.startswith('Agent-C')]
-        if backend_agents:
-            f.write("### Phase 1: Backend & Data Layer\n\n")
-            f.write("**Objective**: Set up backend APIs, databases, and data infrastructure\n\n")
+        for agent, analysis in backend_agents:
+            parts.append(f"#### {agent}\n\n")
+            parts.append(f"**Effort**: {analysis.get('effort_hours', 0)} hours\n\n")
             
-            for agent in backend_agents:
-                agent_key = agent.lower().replace('-', '_')
-                analysis = analyses.get(agent_key, {})
-                
-                f.write(f"#### {agent}\n\n")
-                f.write(f"**Effort**: {analysis.get('effort_hours', 0)} hours\n\n")
-                
-                if analysis.get('changes'):
-                    f.write("**Tasks**:\n")
-                    for change in analysis.get('changes', []):
-                        f.write(f"- [ ] {change}\n")
-                    f.write("\n")
-                
-                if analysis.get('risks'):
-                    f.write("**Risks to Consider**:\n")
-                    for risk in analysis.get('risks', []):
-                        f.write(f"- [WARN] {risk}\n")
-                    f.write("\n")
+            changes = analysis.get('changes')
+            if changes:
+                parts.append("**Tasks**:\n- [ ] " + "\n- [ ] ".join(map(str, changes)) + "\n\n")
             
-            f.write("---\n\n")
+            risks = analysis.get('risks')
+            if risks:
+                parts.append("**Risks to Consider**:\n- [WARN] " + "\n- [WARN] ".join(map(str, risks)) + "\n\n")
+        
+        parts.append("---\n\n")
+    
+    # Phase 2: Frontend development
+    if frontend_agents:
+        parts.append("### Phase 2: Frontend Development\n\n")
+        parts.append("**Objective**: Implement user-facing features and UI components\n\n")
         
-        # Phase 2: Frontend development
-        frontend_agents = [a for a in agents if a.startswith('Agent-A')]
-        if frontend_agents:
-            f.write("### Phase 2: Frontend Development\n\n")
-            f.write("**Objective**: Implement user-facing features and UI components\n\n")
+        for agent, analysis in frontend_agents:
+            parts.append(f"#### {agent}\n\n")
+            parts.append(f"**Effort**: {analysis.get('effort_hours', 0)} hours\n\n")
             
-            for agent in frontend_agents:
-                agent_key = agent.lower().replace('-', '_')
-                analysis = analyses.get(agent_key, {})
-                
-                f.write(f"#### {agent}\n\n")
-                f.write(f"**Effort**: {analysis.get('effort_hours', 0)} hours\n\n")
-                
-                if analysis.get('changes'):
-                    f.write("**Tasks**:\n")
-                    for change in analysis.get('changes', []):
-                        f.write(f"- [ ] {change}\n")
-                    f.write("\n")
-                
-                if analysis.get('components'):
-                    f.write("**Components to Update**:\n")
-                    for comp in analysis.get('components', []):
-                        f.write(f"- {comp}\n")
-                    f.write("\n")
+            changes = analysis.get('changes')
+            if changes:
+                parts.append("**Tasks**:\n- [ ] " + "\n- [ ] ".join(map(str, changes)) + "\n\n")
             
-            f.write("---\n\n")
+            components = analysis.get('components')
+            if components:
+                parts.append("**Components to Update**:\n- " + "\n- ".join(map(str, components)) + "\n\n")
         
-        # Testing & QA
-        f.write("### Phase 3: Testing & Quality Assurance\n\n")
-        f.write("**Objective**: Ensure feature works correctly end-to-end\n\n")
-        f.write("**Tasks**:\n")
-        f.write("- [ ] Unit tests for backend APIs\n")
-        f.write("- [ ] Integration tests for data flow\n")
-        f.write("- [ ] Frontend component tests\n")
-        f.write("- [ ] End-to-end user flow testing\n")
-        f.write("- [ ] Performance testing\n")
-        f.write("- [ ] Security review\n\n")
-        
-        f.write("**Estimated Effort**: 4-8 hours\n\n")
-        f.write("---\n\n")
-        
-        # Deployment
-        f.write("### Phase 4: Deployment\n\n")
-        f.write("**Objective**: Roll out feature to production\n\n")
-        f.write("**Tasks**:\n")
-        f.write("- [ ] Deploy backend services\n")
-        f.write("- [ ] Update database migrations\n")
-        f.write("- [ ] Deploy frontend updates\n")
-        f.write("- [ ] Monitor system health\n")
-        f.write("- [ ] Document new feature\n")
-        f.write("- [ ] Train support team\n\n")
-        
-        f.write("**Estimated Effort**: 2-4 hours\n\n")
-        f.write("---\n\n")
-        
-        # Summary
-        f.write("## Summary\n\n")
-        total_with_testing = json_data.get('total_effort_hours', 0) + 6 + 3
-        f.write(f"**Total Implementation Time**: {total_with_testing} hours ({total_with_testing/8:.1f} days)\n\n")
-        f.write("**Recommended Team**:\n")
-        if any('Agent-A' in a for a in agents):
-            f.write("- Frontend Developer\n")
-        if any('Agent-B' in a for a in agents):
-            f.write("- Backend Developer\n")
-        if any('Agent-C' in a for a in agents):
-            f.write("- IoT/Embedded Systems Engineer\n")
-        f.write("- QA Engineer\n")
-        f.write("- DevOps Engineer\n\n")
-        
-        f.write("**Prerequisites**:\n")
-        f.write("- Development environment set up\n")
-        f.write("- Access to all required services\n")
-        f.write("- Test data available\n")
-        f.write("- Code review process in place\n\n")
-        
-        f.write("**Success Metrics**:\n")
-        f.write("- All tests passing\n")
-        f.write("- Feature meets acceptance criteria\n")
-        f.write("- No performance degradation\n")
-        f.write("- Documentation complete\n")
+        parts.append("---\n\n")
+    
+    # Testing & QA and deployment are the same for every feature
+    parts.append(TESTING_AND_DEPLOYMENT)
+    
+    # Summary
+    parts.append("## Summary\n\n")
+    total_with_testing = json_data.get('total_effort_hours', 0) + 6 + 3
+    parts.append(f"**Total Implementation Time**: {total_with_testing} hours ({total_with_testing/8:.1f} days)\n\n")
+    parts.append("**Recommended Team**:\n")
+    if 'Agent-A' in layers:
+        parts.append("- Frontend Developer\n")
+    if 'Agent-B' in layers:
+        parts.append("- Backend Developer\n")
+    if 'Agent-C' in layers:
+        parts.append("- IoT/Embedded Systems Engineer\n")
+    parts.append(SUMMARY_FOOTER)
+    
+    # Build the whole plan in memory and write it in one go
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write(''.join(parts))
 
 def main():
     if len(sys.argv) < 3:
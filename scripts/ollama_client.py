@@ -0,0 +1,563 @@
+#!/usr/bin/env python3
+"""
+Shared Ollama client used by the AI agent orchestrator and the
+development assistant (dev-tools/ollama-dev-assistant.py)
+"""
+
+import asyncio
+import functools
+import hashlib
+import json
+import math
+import operator
+import os
+import random
+import re
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+try:
+    import orjson  # Optional: faster encode/decode of Ollama payloads
+except ImportError:
+    orjson = None
+
+
+def json_loads(data: Union[str, bytes]):
+    """Decode JSON text or bytes, using orjson when available"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_dumps_bytes(obj) -> bytes:
+    """Encode obj as compact UTF-8 JSON, using orjson when available"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode("utf-8")
+
+
+def json_dumps_compact(obj) -> str:
+    """Encode obj as JSON text without whitespace, using orjson when available"""
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+
+@dataclass
+class TimeoutConfig:
+    """Connect/read timeouts and retry policy for Ollama calls"""
+    connect: float = 10
+    read: float = 120
+    attempts: int = 3
+    backoff: float = 2
+    max_backoff: float = 10
+    stall: float = 30  # Max gap between streamed tokens once output has started
+    
+    @classmethod
+    def from_env(cls, **defaults) -> "TimeoutConfig":
+        """Build a config, letting TIMEOUT_LLM_<FIELD> variables override defaults"""
+        cfg = cls(**defaults)
+        for field in ("connect", "read", "backoff", "max_backoff", "stall"):
+            value = os.environ.get(f"TIMEOUT_LLM_{field.upper()}")
+            if value:
+                setattr(cfg, field, float(value))
+        attempts = os.environ.get("TIMEOUT_LLM_ATTEMPTS")
+        if attempts:
+            cfg.attempts = max(1, int(attempts))
+        return cfg
+    
+    def delay(self, attempt: int) -> float:
+        """Exponential backoff with jitter before retry number attempt (1-based)
+        
+        The jitter keeps agents that failed together from retrying in lockstep.
+        """
+        base = min(self.backoff * 2 ** (attempt - 1), self.max_backoff)
+        return base * random.uniform(0.75, 1.25)
+
+
+class LLMCache:
+    """Exact-match on-disk cache for Ollama responses"""
+    
+    def __init__(self, directory: str, ttl: float = 24 * 3600):
+        self.directory = Path(directory).expanduser()
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def make_key(**parts) -> str:
+        """Hash everything that influences the model output"""
+        raw = json.dumps(parts, sort_keys=True).encode("utf-8")
+        return hashlib.sha256(raw).hexdigest()
+    
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response or None on miss/expiry"""
+        try:
+            with open(self.directory / f"{key}.json", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        
+        if time.time() - entry.get("created", 0) > self.ttl:
+            self.misses += 1
+            return None
+        
+        self.hits += 1
+        return entry.get("response")
+    
+    def set(self, key: str, response: str):
+        """Store a response; cache write failures are never fatal"""
+        path = self.directory / f"{key}.json"
+        tmp = self.directory / f"{key}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"created": time.time(), "response": response}, f)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+
+class SemanticCache:
+    """Near-duplicate prompt cache: reuse a response whose prompt embedding
+    is within threshold cosine similarity of an earlier one"""
+    
+    def __init__(self, directory: str, threshold: float = 0.95, ttl: float = 7 * 24 * 3600):
+        self.path = Path(directory).expanduser() / "semantic.jsonl"
+        self.threshold = threshold
+        self.ttl = ttl
+        self.hits = 0
+        self._lock = threading.Lock()
+        self._entries = None  # scope -> [(unit vector, response)], loaded lazily
+    
+    @staticmethod
+    def _normalize(vector: List[float]) -> Optional[List[float]]:
+        norm = math.sqrt(sum(x * x for x in vector))
+        return [x / norm for x in vector] if norm else None
+    
+    def _load(self) -> Dict[str, List[Tuple[List[float], str]]]:
+        if self._entries is None:
+            self._entries = {}
+            now = time.time()
+            kept, dropped = [], 0
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            dropped += 1  # Partially written line
+                            continue
+                        if now - entry.get("created", 0) > self.ttl:
+                            dropped += 1
+                            continue
+                        kept.append(line)
+                        unit = self._normalize(entry["embedding"])
+                        if unit:
+                            self._entries.setdefault(entry["scope"], []).append(
+                                (unit, entry["response"]))
+            except (OSError, KeyError, TypeError):
+                return self._entries
+            if dropped:
+                self._compact(kept)
+        return self._entries
+    
+    def _compact(self, lines: List[str]):
+        """Rewrite the file with only the live entries so it does not grow forever"""
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.writelines(line if line.endswith("\n") else line + "\n" for line in lines)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+    
+    def get(self, scope: str, embedding: List[float]) -> Optional[str]:
+        """Return the response of the most similar prompt in scope, if close enough"""
+        unit = self._normalize(embedding)
+        if not unit:
+            return None
+        with self._lock:
+            candidates = self._load().get(scope, [])
+            best, response = 0.0, None
+            for vector, cached in candidates:
+                if len(vector) != len(unit):
+                    continue
+                score = sum(map(operator.mul, vector, unit))
+                if score > best:
+                    best, response = score, cached
+        if best >= self.threshold:
+            self.hits += 1
+            return response
+        return None
+    
+    def add(self, scope: str, embedding: List[float], response: str):
+        """Remember a response; cache write failures are never fatal"""
+        unit = self._normalize(embedding)
+        if not unit:
+            return
+        entry = {"created": time.time(), "scope": scope, "embedding": embedding, "response": response}
+        with self._lock:
+            self._load().setdefault(scope, []).append((unit, response))
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry) + "\n")
+            except OSError:
+                pass
+
+
+_JSON_STRUCTURE_RE = re.compile(r'[{}"\\]')
+
+
+class JsonObjectScanner:
+    """Incrementally detect when the first top-level JSON object is complete"""
+    
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+    
+    def feed(self, text: str) -> Optional[int]:
+        """Consume more text; once the outermost object has closed, return
+        the offset in text just past its final brace, otherwise None"""
+        # Only braces, quotes and backslashes matter, so let the regex
+        # engine skip everything else instead of looping per character
+        skip = 0 if self.escaped else -1  # Position escaped by a backslash
+        self.escaped = False
+        for match in _JSON_STRUCTURE_RE.finditer(text):
+            pos = match.start()
+            if pos == skip:
+                continue
+            ch = match.group()
+            if self.in_string:
+                if ch == "\\":
+                    skip = pos + 1
+                    self.escaped = skip == len(text)
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                # Quotes in prose before the object are not JSON strings
+                self.in_string = self.depth > 0
+            elif ch == "{":
+                self.depth += 1
+            elif ch == "}" and self.depth:
+                self.depth -= 1
+                if self.depth == 0:
+                    return pos + 1
+        return None
+
+
+class OllamaClient:
+    """Pooled, cached, streaming client for the Ollama generate API"""
+    
+    def __init__(self, host: str = "http://10.0.2.2:11434", model: str = "llama3:8b",
+                 use_cache: bool = True, timeout: Optional[TimeoutConfig] = None,
+                 max_concurrency: Optional[int] = None, cache_dir: str = "~/.cache/ai-agent-orchestrator",
+                 options: Optional[Dict] = None, semantic_threshold: Optional[float] = None,
+                 embed_model: Optional[str] = None, keep_alive: Optional[str] = "30m"):
+        self.host = host
+        self.model = model  # Model name from Ollama
+        self.keep_alive = keep_alive  # How long Ollama keeps the model and its KV cache loaded
+        self.options = options  # Sampling options; None uses the model defaults
+        self.timeout = timeout or TimeoutConfig.from_env()
+        self.cache = LLMCache(cache_dir) if use_cache else None
+        
+        # Optional second tier matching near-identical prompts by embedding;
+        # enabled with LLM_SEMANTIC_THRESHOLD (e.g. 0.95)
+        if semantic_threshold is None and os.environ.get("LLM_SEMANTIC_THRESHOLD"):
+            semantic_threshold = float(os.environ["LLM_SEMANTIC_THRESHOLD"])
+        self.semantic_cache = (SemanticCache(cache_dir, semantic_threshold)
+                               if use_cache and semantic_threshold else None)
+        self.embed_model = embed_model or os.environ.get("LLM_EMBED_MODEL") or "nomic-embed-text"
+        
+        # Cap in-flight requests so parallel agents cannot flood one Ollama server;
+        # by default match the server's own OLLAMA_NUM_PARALLEL when it is exported
+        if max_concurrency is None:
+            max_concurrency = int(os.environ.get("OLLAMA_NUM_PARALLEL") or 4)
+        max_concurrency = max(1, max_concurrency)
+        self._semaphore = threading.Semaphore(max_concurrency)
+        self._metrics_lock = threading.Lock()
+        self.metrics = {"calls": 0, "cached_hits": 0, "total_wall_time": 0.0,
+                        "total_tokens_generated": 0}
+        
+        # Worker threads for agenerate(). Python joins them at exit, so a call
+        # that was given up on must be stopped with cancel(). Threads and
+        # pooled connections never run short of the in-flight cap, with room
+        # left for embedding and warmup calls
+        pool_size = max(10, max_concurrency)
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="ollama")
+        self._streams = {}  # cancel event -> open streaming response
+        self._streams_lock = threading.Lock()
+        
+        # One keep-alive pool shared by every agent call
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "Connection": "keep-alive",
+            "Accept-Encoding": "gzip, deflate"
+        })
+    
+    def close(self):
+        """Release pooled connections and worker threads"""
+        self.executor.shutdown(wait=False)
+        self.session.close()
+    
+    def cancel(self, event: threading.Event):
+        """Abort the call started with this cancel event, waking a blocked read"""
+        event.set()
+        with self._streams_lock:
+            response = self._streams.get(event)
+        if response is None:
+            return
+        # close() alone does not wake a thread blocked in recv()
+        sock = getattr(getattr(response.raw, "_connection", None), "sock", None)
+        try:
+            if sock is not None:
+                sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        response.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+    
+    def ping(self):
+        """Fail fast if Ollama is unreachable or the model is not installed"""
+        try:
+            self.session.get(f"{self.host}/api/tags", timeout=5).raise_for_status()
+            response = self.session.post(f"{self.host}/api/show", json={"name": self.model}, timeout=5)
+        except requests.exceptions.RequestException as e:
+            raise RuntimeError(f"Cannot reach Ollama at {self.host}: {e}") from e
+        if response.status_code == 404:
+            raise RuntimeError(f"Model {self.model} is not installed on {self.host}. "
+                               f"Run: ollama pull {self.model}")
+        if not response.ok:
+            raise RuntimeError(f"Ollama at {self.host} returned HTTP {response.status_code} for {self.model}")
+    
+    def warmup(self, keep_alive: Optional[str] = None):
+        """Load the model ahead of the first real call and keep it resident"""
+        payload = {"model": self.model, "prompt": "", "stream": False,
+                   "keep_alive": keep_alive or self.keep_alive or "30m"}
+        try:
+            self.session.post(f"{self.host}/api/generate", data=json_dumps_bytes(payload),
+                              headers={"Content-Type": "application/json"},
+                              timeout=(self.timeout.connect, self.timeout.read)).raise_for_status()
+        except requests.exceptions.RequestException as e:
+            print(f"[WARN] Model warmup failed: {e}", file=sys.stderr)
+    
+    def embed(self, text: str) -> Optional[List[float]]:
+        """Return the embedding of text, or None if Ollama cannot provide one"""
+        try:
+            response = self.session.post(
+                f"{self.host}/api/embeddings",
+                data=json_dumps_bytes({"model": self.embed_model, "prompt": text}),
+                headers={"Content-Type": "application/json"},
+                timeout=(self.timeout.connect, self.timeout.read))
+            response.raise_for_status()
+            return json_loads(response.content).get("embedding") or None
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"[WARN] Embedding request failed: {e}", file=sys.stderr)
+            return None
+    
+    def generate(self, prompt: str, system_prompt: Optional[str] = None,
+                 format: Union[str, Dict, None] = "json",
+                 on_token: Optional[Callable[[], None]] = None,
+                 raise_errors: bool = False, max_tokens: Optional[int] = None,
+                 cancel: Optional[threading.Event] = None,
+                 cacheable: Optional[Callable[[str], object]] = None,
+                 semantic_text: Optional[str] = None) -> str:
+        """Generate response from Ollama
+        
+        format is passed through to Ollama: "json" for JSON mode, a JSON
+        schema dict for structured output, or None for free text.
+        on_token is called for every streamed token. max_tokens caps the
+        reply length (num_predict). Errors are logged and give "" unless
+        raise_errors is set. Once cancel is set (see cancel()) the call
+        gives up quietly and returns "" without retrying. cacheable, if
+        given, decides whether a fresh reply is worth caching.
+        
+        semantic_text is the part of prompt that differs between similar
+        calls, e.g. the feature request; only calls that give it use the
+        semantic cache. It alone is embedded, and the rest of the prompt
+        must match exactly, so a shared template cannot make unrelated
+        requests look alike.
+        """
+        try:
+            url = f"{self.host}/api/generate"
+            payload = {
+                "model": self.model,
+                "prompt": prompt,
+                "stream": True
+            }
+            options = self.options
+            if max_tokens:
+                options = {**(options or {}), "num_predict": max_tokens}
+            if options:
+                payload["options"] = options
+            if format:
+                payload["format"] = format  # Constrain output only when needed
+            if system_prompt:
+                payload["system"] = system_prompt
+            
+            cache_key = None
+            if self.cache:
+                cache_key = LLMCache.make_key(**payload)
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    self._record(cached_hit=True)
+                    return cached
+            
+            # Reusing the answer to a merely similar prompt is only sound when
+            # sampling is close to deterministic
+            semantic_scope = embedding = None
+            temperature = (options or {}).get("temperature", 0.8)
+            if self.semantic_cache and semantic_text and temperature <= 0.3:
+                semantic_scope = LLMCache.make_key(
+                    model=self.model, system=system_prompt, format=format, options=options,
+                    template=prompt.replace(semantic_text, ""))
+                embedding = self.embed(semantic_text)
+                if embedding:
+                    cached = self.semantic_cache.get(semantic_scope, embedding)
+                    if cached is not None:
+                        self._record(cached_hit=True)
+                        return cached
+            
+            # Not part of the cache key: it does not change the output
+            if self.keep_alive:
+                payload["keep_alive"] = self.keep_alive
+            
+            # A stalled or dropped call is retried with backoff instead of
+            # holding up the whole analysis
+            for attempt in range(1, self.timeout.attempts + 1):
+                try:
+                    with self._semaphore:
+                        if cancel and cancel.is_set():
+                            return ""
+                        started = time.monotonic()
+                        text, tokens = self._stream(url, payload, format, on_token, cancel)
+                    self._record(wall_time=time.monotonic() - started, tokens=tokens)
+                    break
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                    if cancel and cancel.is_set():
+                        return ""
+                    if attempt == self.timeout.attempts:
+                        raise
+                    delay = self.timeout.delay(attempt)
+                    print(f"[WARN] Ollama call failed ({e}), retrying in {delay:.0f}s", file=sys.stderr)
+                    if cancel:
+                        cancel.wait(delay)
+                    else:
+                        time.sleep(delay)
+            
+            if cancel and cancel.is_set():
+                return ""
+            
+            if text and (cacheable is None or cacheable(text)):
+                if cache_key:
+                    self.cache.set(cache_key, text)
+                if embedding:
+                    self.semantic_cache.add(semantic_scope, embedding, text)
+            return text
+        except Exception as e:
+            if cancel and cancel.is_set():
+                return ""
+            if raise_errors:
+                raise
+            print(f"Error calling Ollama: {e}", file=sys.stderr)
+            return ""
+    
+    def _record(self, cached_hit: bool = False, wall_time: float = 0.0, tokens: int = 0):
+        """Add one call to the shared metrics (called from worker threads)"""
+        with self._metrics_lock:
+            self.metrics["calls"] += 1
+            self.metrics["cached_hits"] += cached_hit
+            self.metrics["total_wall_time"] += wall_time
+            self.metrics["total_tokens_generated"] += tokens
+    
+    def metrics_summary(self) -> str:
+        """One-line summary of the calls made through this client"""
+        m = self.metrics
+        rate = m["total_tokens_generated"] / m["total_wall_time"] if m["total_wall_time"] else 0.0
+        return (f"{m['calls']} calls ({m['cached_hits']} cached), "
+                f"{m['total_tokens_generated']} tokens in {m['total_wall_time']:.1f}s ({rate:.1f} tok/s)")
+    
+    async def agenerate(self, prompt: str, system_prompt: Optional[str] = None,
+                        format: Union[str, Dict, None] = "json",
+                        on_token: Optional[Callable[[], None]] = None,
+                        max_tokens: Optional[int] = None,
+                        cancel: Optional[threading.Event] = None,
+                        semantic_text: Optional[str] = None) -> str:
+        """Awaitable generate() that runs on the shared session in a worker thread
+        
+        Cancelling the awaiting task does not stop the worker thread; pass
+        cancel and call cancel() on it for that.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(self.generate, prompt, system_prompt, format, on_token,
+                                             max_tokens=max_tokens, cancel=cancel,
+                                             semantic_text=semantic_text))
+    
+    def _stream(self, url: str, payload: Dict, format: Union[str, Dict, None],
+                on_token: Optional[Callable[[], None]] = None,
+                cancel: Optional[threading.Event] = None) -> Tuple[str, int]:
+        """POST one streaming generate request; return (text, tokens generated)"""
+        # Stream tokens; for JSON responses stop reading as soon as the
+        # object is closed instead of waiting for trailing output
+        chunks = []
+        scanner = JsonObjectScanner() if format else None
+        with self.session.post(url, data=json_dumps_bytes(payload),
+                               headers={"Content-Type": "application/json"},
+                               timeout=(self.timeout.connect, self.timeout.read), stream=True) as response:
+            if cancel:
+                # Registered before checking the event so cancel() cannot miss us
+                with self._streams_lock:
+                    self._streams[cancel] = response
+            try:
+                if cancel and cancel.is_set():
+                    raise requests.exceptions.ConnectionError("Ollama call cancelled")
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if cancel and cancel.is_set():
+                        raise requests.exceptions.ConnectionError("Ollama call cancelled")
+                    if not line:
+                        continue
+                    data = json_loads(line)
+                    if "error" in data:
+                        raise RuntimeError(data["error"])
+                    piece = data.get("response", "")
+                    if on_token:
+                        on_token()
+                    end = scanner.feed(piece) if scanner else None
+                    if end is not None:
+                        chunks.append(piece[:end])
+                        break
+                    chunks.append(piece)
+                    if data.get("done"):
+                        tokens = data.get("eval_count")
+                        if tokens is not None:
+                            return "".join(chunks), tokens
+                        break
+            finally:
+                if cancel:
+                    with self._streams_lock:
+                        self._streams.pop(cancel, None)
+        # Without a final eval_count, one streamed line is one token
+        return "".join(chunks), len(chunks)